@@ -13,13 +13,24 @@ LIMS数据处理程序 - 电池数据分析工具
 """
 
 import os
+import io
 import re
 import time
+import functools
+import contextlib
+import gc
+import glob
+import hashlib
 import warnings
 import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import seaborn as sns
 import python_calamine
 from openpyxl.utils import get_column_letter
@@ -27,7 +38,12 @@ from pandas import ExcelWriter
 from tqdm import tqdm
 
 from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
+
+# Z-score异常检测的时间序列去趋势（可选依赖，缺失时只使用标准Z-score）
+try:
+    from scipy.signal import detrend as _detrend
+except ImportError:
+    _detrend = None
 
 # 忽略警告信息
 warnings.filterwarnings('ignore')
@@ -38,9 +54,9 @@ class TeeOutput:
         self.files = files
 
     def write(self, text):
+        # 不在每次写入后刷新，由调用方在阶段边界统一调用flush()
         for file in self.files:
             file.write(text)
-            file.flush()
 
     def flush(self):
         for file in self.files:
@@ -48,18 +64,42 @@ class TeeOutput:
 
 class ProcessingLogger:
     """处理日志管理器"""
-    def __init__(self, output_dir=None):
+    # 日志级别数值，与logging模块一致
+    LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+    def __init__(self, output_dir=None, log_level="INFO"):
         self.output_dir = output_dir or os.getcwd()
         self.timestamp = time.strftime('%Y%m%d_%H%M%S')
 
+        # 按日志级别决定是否写入：异常检测日志属于INFO级别，调试日志属于DEBUG级别
+        level = self.LEVELS.get(str(log_level).upper(), self.LEVELS["INFO"])
+        self.outlier_enabled = level <= self.LEVELS["INFO"]
+        self.debug_enabled = level <= self.LEVELS["DEBUG"]
+
+        # 日志行时间戳缓存（同一秒内的日志复用已格式化的字符串）
+        self._last_ts_sec = -1
+        self._last_ts_str = ''
+
+        # 异常检测和调试日志先缓存为行列表，由flush()成批写入
+        self._outlier_lines = []
+        self._debug_lines = []
+
         # 创建日志文件夹
         self.log_dir = os.path.join(self.output_dir, f"处理日志-{self.timestamp}")
         os.makedirs(self.log_dir, exist_ok=True)
 
-        # 创建不同类型的日志文件（使用无缓冲模式确保实时写入）
-        self.main_log_file = open(os.path.join(self.log_dir, "主要处理日志.txt"), "w", encoding='utf-8', buffering=1)
-        self.outlier_log_file = open(os.path.join(self.log_dir, "异常检测详细日志.txt"), "w", encoding='utf-8', buffering=1)
-        self.debug_log_file = open(os.path.join(self.log_dir, "调试详细日志.txt"), "w", encoding='utf-8', buffering=1)
+        # 创建不同类型的日志文件（使用64KiB块缓冲，减少逐行写入的系统调用）
+        # 异常检测日志和调试日志只在对应级别启用时创建，避免留下空文件
+        self.main_log_file = open(os.path.join(self.log_dir, "主要处理日志.txt"), "w", encoding='utf-8',
+                                  buffering=1 << 16)
+        self.outlier_log_file = None
+        if self.outlier_enabled:
+            self.outlier_log_file = open(os.path.join(self.log_dir, "异常检测详细日志.txt"), "w", encoding='utf-8',
+                                         buffering=1 << 16)
+        self.debug_log_file = None
+        if self.debug_enabled:
+            self.debug_log_file = open(os.path.join(self.log_dir, "调试详细日志.txt"), "w", encoding='utf-8',
+                                       buffering=1 << 16)
 
         # 保存原始stdout
         self.original_stdout = sys.stdout
@@ -70,17 +110,38 @@ class ProcessingLogger:
         print(f"日志系统已启动，日志保存到: {self.log_dir}")
         print("=" * 80)
 
-    def log_outlier_detection(self, message):
-        """记录异常检测相关信息"""
-        timestamp = time.strftime('%H:%M:%S')
-        self.outlier_log_file.write(f"[{timestamp}] {message}\n")
-        self.outlier_log_file.flush()
+    def _now(self):
+        """返回当前时间的HH:MM:SS字符串，秒数变化时才重新格式化"""
+        sec = int(time.time())
+        if sec != self._last_ts_sec:
+            self._last_ts_sec = sec
+            self._last_ts_str = time.strftime('%H:%M:%S', time.localtime(sec))
+        return self._last_ts_str
+
+    def log_outlier_detection(self, message, *args):
+        """记录异常检测相关信息（有参数时按%格式化，级别未启用时不做格式化）"""
+        if not self.outlier_enabled:
+            return
+        if args:
+            message = message % args
+        self._outlier_lines.append(f"[{self._now()}] {message}")
 
-    def log_debug(self, message):
-        """记录调试信息"""
-        timestamp = time.strftime('%H:%M:%S')
-        self.debug_log_file.write(f"[{timestamp}] {message}\n")
-        self.debug_log_file.flush()
+    def log_debug(self, message, *args):
+        """记录调试信息（有参数时按%格式化，级别未启用时不做格式化）"""
+        if not self.debug_enabled:
+            return
+        if args:
+            message = message % args
+        self._debug_lines.append(f"[{self._now()}] {message}")
+
+    def flush(self):
+        """将缓存的异常检测和调试日志行一次性写入对应文件"""
+        if self._outlier_lines:
+            self.outlier_log_file.write('\n'.join(self._outlier_lines) + '\n')
+            self._outlier_lines.clear()
+        if self._debug_lines:
+            self.debug_log_file.write('\n'.join(self._debug_lines) + '\n')
+            self._debug_lines.clear()
 
     def close(self):
         """关闭日志系统"""
@@ -88,16 +149,23 @@ class ProcessingLogger:
         print(f"处理完成！详细日志已保存到: {self.log_dir}")
         print("日志文件说明:")
         print(f"  - 主要处理日志.txt: 主要处理过程和结果")
-        print(f"  - 异常检测详细日志.txt: Z-score异常检测的详细信息")
-        print(f"  - 调试详细日志.txt: 完整的调试信息")
+        if self.outlier_log_file is not None:
+            print(f"  - 异常检测详细日志.txt: Z-score异常检测的详细信息")
+        if self.debug_log_file is not None:
+            print(f"  - 调试详细日志.txt: 完整的调试信息")
+        else:
+            print(f"  （调试详细日志仅在RUNTIME_CONFIG中log_level设为DEBUG时生成）")
 
         # 恢复原始stdout
         sys.stdout = self.original_stdout
 
-        # 关闭文件
+        # 写入尚未落盘的缓存日志后关闭文件
+        self.flush()
         self.main_log_file.close()
-        self.outlier_log_file.close()
-        self.debug_log_file.close()
+        if self.outlier_log_file is not None:
+            self.outlier_log_file.close()
+        if self.debug_log_file is not None:
+            self.debug_log_file.close()
 
 # ===== 全局配置参数 =====
 CONFIG = {
@@ -202,6 +270,7 @@ CONFIG = {
             # PCA分析配置
             "n_components": 2,          # PCA组件数
             "visualization_enabled": True, # 是否启用可视化
+            "skip_pca_when_full_rank": True, # 保留全部主成分且不可视化时跳过PCA，直接在标准化空间计算距离
             "safe_voltage_threshold": 4.65  # 安全电压阈值(V)
         },
 
@@ -228,7 +297,9 @@ CONFIG = {
             "voltage_weight": 0.1,     # 电压保持率在综合评分中的权重(0-1)
             "energy_weight": 0.3,      # 能量保持率在综合评分中的权重(0-1)
             "voltage_column": "当前电压保持",  # 电压保持率列名
-            "energy_column": "当前能量保持"    # 能量保持率列名
+            "energy_column": "当前能量保持",   # 能量保持率列名
+            "save_plots": None,        # 是否保存保留率曲线比较图，None时跟随详细模式(verbose)
+            "plot_dpi": 100            # 保留率曲线比较图的保存分辨率
         },
 
         # 选择方法优先级
@@ -264,7 +335,10 @@ CONFIG = {
             },
             'use_time_series': True,     # 是否使用时间序列分解
             'min_samples_for_stl': 10,   # STL分解最小样本数
-            'generate_plots': True       # 是否生成分布图
+            'generate_plots': False,     # 是否生成分布图（批次较多时绘图耗时明显，默认关闭）
+            'max_batches_to_plot': None, # 最多绘制的批次数，None表示全部绘制
+            'plot_dpi': 110,             # 分布图保存DPI（诊断用图，较低DPI即可看清）
+            'png_compress_level': 1      # PNG压缩级别(0-9)，级别越低编码越快，文件略大
         }
     },
 
@@ -288,7 +362,8 @@ CONFIG = {
         "font_family": "SimHei",  # 字体
         "font_size": 10,          # 字体大小
         "backend": "Agg",         # 后端（非交互式，不显示图片）
-        "dpi": 300,               # 图像DPI
+        "dpi": 150,               # 分析图表保存DPI
+        "png_compress_level": 3,  # PNG压缩级别(0-9)，级别越低编码越快，文件略大
         "figsize": (10, 6),       # 默认图像大小
         "interactive": True       # 是否启用交互模式
     },
@@ -306,6 +381,11 @@ CONFIG = {
         "verbose": False,             # 是否显示详细输出
         "max_iterations": 10,         # 异常值检测最大迭代次数
         "chunk_size": 50,             # 文件处理分块大小
+        "max_workers": None,          # 文件读取与绘图并行进程数，None表示使用CPU核心数，1表示串行处理
+        "parallel_min_tasks": 50,     # 任务数（文件数或绘图批次数）少于该值时串行处理，避免启动工作进程的开销超过收益
+        "disk_cache_enabled": True,   # 是否将Cycle表解析结果缓存到磁盘，重复运行时跳过Excel解析
+        # 磁盘缓存目录：相对路径时位于数据文件所在文件夹下；每个文件只保留最新一份缓存，可随时整个删除
+        "disk_cache_dir": os.path.join(".cache", "cycle"),
         "memory_limit_mb": 500,       # 内存使用限制(MB)
         "enable_progress_bar": True,  # 是否显示进度条
         "auto_open_results": False,   # 是否自动打开结果文件
@@ -328,7 +408,14 @@ CONFIG = {
 
     # 输出配置
     "OUTPUT_CONFIG": {
-        "excel_engine": "openpyxl",   # Excel写入引擎
+        "excel_engine": "xlsxwriter", # Excel写入引擎（流式写出，比openpyxl快；仅写入数据无需openpyxl的后处理功能）
+        # xlsxwriter工作簿选项：关闭字符串到公式/链接/数字的逐单元格识别，写出更快且保留原始文本
+        # （不可开启constant_memory：pandas按列写入单元格，该模式只保留当前行，会丢失数据）
+        "xlsxwriter_options": {
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+            "strings_to_numbers": False
+        },
         "include_charts": True,       # 是否包含图表
         "chart_dpi": 300,            # 图表分辨率
         "save_intermediate_results": False, # 是否保存中间结果
@@ -340,6 +427,415 @@ CONFIG = {
 
 # 删除ConfigManager类，直接使用CONFIG
 
+# 预编译的文件名解析正则
+_CHANNEL_RE = re.compile(r'CH[-_]?(\d+)', re.IGNORECASE)
+_DATE_RE = re.compile(r'(\d{4}[-/]?\d{2}[-/]?\d{2}|\d{6}|\d{2}\d{2})')
+# 测试模式：一次扫描找出文件名中所有（含重叠）出现的模式，再按配置顺序取优先级最高者
+# （模式只有几个，单个交替正则已足够；若模式数量增长到上百个，可改用Aho-Corasick自动机）
+_MODE_RE = re.compile('(?=(' + '|'.join(re.escape(p) for p in CONFIG["MODE_CONFIG"]["patterns"]) + '))')
+_MODE_PRIORITY = {p: i for i, p in enumerate(CONFIG["MODE_CONFIG"]["patterns"])}
+
+# Cycle表各列在读取结果中的位置
+_CYCLE_COL_IDX = {col: i for i, col in enumerate(CONFIG["CYCLE_SHEET_COLS"])}
+
+# 文件名中的主机和通道（规则同_extract_host_and_channel：首段含"."为IP格式，主机2段；否则主机3段；通道均为其后2段）
+_HOST_CHANNEL_RE = re.compile(r'^(?:(?P<ip_host>[^-]*\.[^-]*-[^-]*)-(?P<ip_channel>[^-]*-[^-]*)'
+                              r'|(?P<host>[^-]*-[^-]*-[^-]*)-(?P<channel>[^-]*-[^-]*))(?:-|$)')
+
+# 文件名中不允许出现的字符（保留字母、数字、下划线、空格和连字符）
+_UNSAFE_FILENAME_RE = re.compile(r'[^\w\- ]+')
+
+# 原始放电容量法重新计算保留率时需要从Cycle表读取的列
+_RAW_CAPACITY_COLS = ('循环序号', '放电比容量(mAh/g)', '放电比能量(mWh/g)', '放电中值电压(V)')
+
+# 逐文件判定使用的阈值（模块加载时绑定，避免每个文件重复查找嵌套字典）
+_HIGH_CHG = CONFIG["ABNORMAL_THRESHOLDS"]['high_charge']
+_LOW_CHG = CONFIG["ABNORMAL_THRESHOLDS"]['low_charge']
+_LOW_DIS = CONFIG["ABNORMAL_THRESHOLDS"]['low_discharge']
+_RATIO_THR = CONFIG["ONE_C_THRESHOLDS"]["ratio_threshold"]
+_DIFF_THR = CONFIG["ONE_C_THRESHOLDS"]["discharge_diff_threshold"]
+_OVERCHARGE_THR = CONFIG["ONE_C_THRESHOLDS"]["overcharge_threshold"]
+_VERY_LOW_EFF_THR = CONFIG["ONE_C_THRESHOLDS"]["very_low_efficiency_threshold"]
+_LOW_EFF_THR = CONFIG["ONE_C_THRESHOLDS"]["low_efficiency_threshold"]
+_ONE_C_MODES = frozenset(CONFIG["MODE_CONFIG"]["one_c_modes"])
+# 统计结果中直接取参考通道实际值的字段（统计字段名 -> 参考通道列名）
+_REF_CHANNEL_FIELDS = {
+    '1C首圈编号': '1C首圈编号',
+    '1C首充': '1C首充',
+    '1C首放': '1C首放',
+    '1C首效': '1C首效',
+    '1C倍率比': '1C倍率比',
+    '参考通道当前圈数': '当前圈数',
+    '当前容量保持': '当前容量保持',
+    '电压衰减率mV/周': '电压衰减率mV/周',
+    '当前电压保持': '当前电压保持',
+    '当前能量保持': '当前能量保持',
+}
+# 1C状态取值（分类类型的类别，顺序与_classify_1c_status中的编码一致）
+_ONE_C_STATUS_CATEGORIES = ['正常', '1C过充', '首效过低', '首效低']
+
+
+# ===== 逐文件数值判定内核（纯函数，不依赖pandas和实例状态） =====
+def _is_abnormal(first_charge, first_discharge, high_charge, low_charge, low_discharge):
+    """判断首圈充放电容量是否超出正常范围
+
+    Returns:
+        布尔值，True表示异常
+    """
+    return (first_charge > high_charge or
+            first_charge < low_charge or
+            first_discharge < low_discharge)
+
+
+def _find_1c_start(discharge, first_discharge, ratio_threshold, diff_threshold):
+    """查找首个同时满足比值和差值标准的循环作为1C首圈
+
+    Args:
+        discharge: 参与检查的放电比容量数组（从首圈开始，首圈本身不参与判定）
+        first_discharge: 首圈放电比容量
+        ratio_threshold: 与首圈放电容量的比值阈值
+        diff_threshold: 与首圈放电容量的差值阈值
+
+    Returns:
+        1C首圈索引（从0开始），未找到时返回-1
+    """
+    candidates = discharge[1:]
+    matched = (candidates / first_discharge < ratio_threshold) & (first_discharge - candidates > diff_threshold)
+    return 1 + int(np.argmax(matched)) if matched.any() else -1
+
+
+# ===== 异常值检测内核（纯numpy函数） =====
+def _modified_zscores(values, mad_constant, min_mad_ratio):
+    """按列计算基于中位数和MAD的修正Z-score，一次处理一个批次的所有指标
+
+    Args:
+        values: 二维float64数组（样本×指标），空值为NaN且不参与中位数计算
+        mad_constant: MAD常数
+        min_mad_ratio: MAD最小值占中位数的比例
+
+    Returns:
+        (各列中位数, 调整后的MAD, 原始MAD, 修正Z-score矩阵)，MAD为0的列Z-score为NaN
+    """
+    median = np.nanmedian(values, axis=0)
+    deviations = values - median
+    original_mad = np.nanmedian(np.abs(deviations), axis=0)
+
+    # 应用MAD最小值限制
+    mad = np.maximum(original_mad, median * min_mad_ratio)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_scores = mad_constant * deviations / np.where(mad == 0, np.nan, mad)
+    return median, mad, original_mad, z_scores
+
+
+def _channel_labels(df):
+    """按行生成"主机-通道"标识列表（按列取值拼接，不逐行构造Series）
+
+    Args:
+        df: 含主机、通道列的DataFrame
+
+    Returns:
+        标识字符串列表，顺序同df的行
+    """
+    return [f"{host}-{channel}" for host, channel in zip(df['主机'], df['通道'])]
+
+
+def _ascii_dump(text):
+    """字符串各字符的编码值，用于排查隐藏字符或格式问题
+
+    Args:
+        text: 任意值，按字符串处理
+
+    Returns:
+        逗号分隔的编码值字符串
+    """
+    # UTF-32LE编码的每4字节即一个字符的码位，与逐字符ord()结果相同
+    return ','.join(map(str, np.frombuffer(str(text).encode('utf-32-le'), dtype=np.uint32).tolist()))
+
+
+@functools.lru_cache(maxsize=64)
+def _cycle_weights(n_cycles, weight_method, weight_factor, late_emphasis):
+    """按权重配置计算各循环的MSE权重（带缓存，结果只读）
+
+    Args:
+        n_cycles: 循环数
+        weight_method: 权重方法：'linear', 'exp', 'constant'
+        weight_factor: 权重因子
+        late_emphasis: 后期循环的权重倍数
+
+    Returns:
+        权重数组，和为n_cycles
+    """
+    if weight_method == "constant":
+        # 恒定权重
+        weights = np.ones(n_cycles)
+    elif weight_method == "linear":
+        # 线性增长权重: w_j = 1 + weight_factor * j/(n-1)
+        weights = 1 + weight_factor * np.linspace(0, 1, n_cycles)
+    elif weight_method == "exp":
+        # 指数增长权重: w_j = exp(weight_factor * j/(n-1))
+        weights = np.exp(weight_factor * np.linspace(0, 1, n_cycles))
+    else:
+        # 默认使用线性权重
+        weights = 1 + weight_factor * np.linspace(0, 1, n_cycles)
+
+    # 对后期循环额外加权
+    if late_emphasis > 1.0 and n_cycles > 10:
+        # 确定后期循环的起始位置（最后30%的循环）
+        late_start = int(n_cycles * 0.7)
+        # 对后期循环应用额外权重
+        weights[late_start:] *= late_emphasis
+
+    # 归一化权重，使其和为n_cycles
+    weights = weights * n_cycles / np.sum(weights)
+    weights.flags.writeable = False
+    return weights
+
+
+def _curve_mse(curves, weights=None):
+    """计算每条曲线与平均曲线的（加权）均方误差
+
+    保留率均为百分数，float32精度足够，按float32连续数组计算以减少内存访问。
+
+    Args:
+        curves: 二维数组，每行一条曲线
+        weights: 与曲线等长的权重数组，None时计算普通MSE
+
+    Returns:
+        (各曲线MSE数组, 平均曲线)
+    """
+    curves = np.ascontiguousarray(curves, dtype=np.float32)
+    mean_curve = curves.mean(axis=0)
+    diff = curves - mean_curve
+    # 平方、加权与求和在einsum中一次完成，不再生成平方误差临时数组
+    if weights is None:
+        return np.einsum('ij,ij->i', diff, diff) / diff.shape[1], mean_curve
+    weights = np.asarray(weights, dtype=np.float32)
+    return np.einsum('ij,ij,j->i', diff, diff, weights) / weights.sum(), mean_curve
+
+
+def _nearest_standardized_row(values):
+    """按列标准化后，返回与各列均值距离（平方和）最小的行号，并列时取首个
+
+    Args:
+        values: 二维数组，每行一个样本，每列一个特征（不含NaN，至少2行）
+
+    Returns:
+        行号
+    """
+    values = np.asarray(values, dtype=np.float64)
+    std = values.std(axis=0, ddof=1)
+    # 常数列对距离没有贡献，避免除以0
+    std[std == 0] = 1.0
+    z = (values - values.mean(axis=0)) / std
+    return int(np.argmin(np.einsum('ij,ij->i', z, z)))
+
+
+def _interp_rows_linear(x, y, counts, x_new, node_rows=None):
+    """逐行分段线性插值（两端按首末区间外推），所有行一次完成，结果与interp1d线性外推一致
+
+    Args:
+        x: 二维数组，每行为升序排列的插值节点，行尾不足部分以inf填充
+        y: 节点取值，每行对应x的一行，列数和dtype与x相同
+        counts: x每行的有效节点数（不少于2）
+        x_new: 一维升序插值位置数组
+        node_rows: y各行使用的x行号，None时与x逐行对应；多行取值共用同一组节点时只查找一次区间
+
+    Returns:
+        二维数组，形状为(y的行数, len(x_new))
+    """
+    # 每个插值位置所在区间 = 小于它的节点个数-1，并限制在该行的有效区间内
+    # （逐行二分查找，插值位置升序时searchsorted从上一个结果处继续，避免构造 行数×插值点数×节点数 的比较数组）
+    segment = np.array([np.searchsorted(row[:count], x_new, side='left') for row, count in zip(x, counts)]) - 1
+    segment = np.clip(segment, 0, (counts - 2)[:, None])
+
+    x0 = np.take_along_axis(x, segment, axis=1)
+    x1 = np.take_along_axis(x, segment + 1, axis=1)
+    if node_rows is not None:
+        segment, x0, x1 = segment[node_rows], x0[node_rows], x1[node_rows]
+    y0 = np.take_along_axis(y, segment, axis=1)
+    y1 = np.take_along_axis(y, segment + 1, axis=1)
+
+    # (y1 - y0) / (x1 - x0) * (x_new - x0) + y0，在取出的数组上原地计算，不再生成中间临时数组
+    np.subtract(y1, y0, out=y1)
+    np.subtract(x1, x0, out=x1)
+    np.divide(y1, x1, out=y1)
+    np.subtract(x_new[None, :], x0, out=x0)
+    np.multiply(y1, x0, out=y1)
+    np.add(y1, y0, out=y1)
+    return y1
+
+
+# ===== 工作簿读取 =====
+def _text_to_float(cell):
+    """将Cycle表中非数值单元格转换为浮点数（以文本存储的数字），无法转换时返回NaN
+
+    Args:
+        cell: 单元格值
+
+    Returns:
+        浮点数或NaN
+    """
+    if isinstance(cell, str) and cell:
+        try:
+            return float(cell)
+        except ValueError:
+            pass
+    return np.nan
+
+
+# Cycle表解析规则版本，规则变化时递增，使已有的磁盘缓存失效
+_CYCLE_PARSE_VERSION = 2
+
+
+def _disk_cache_path(file_path, mtime, size, columns):
+    """计算Cycle表磁盘缓存文件路径
+
+    缓存目录为相对路径时放在数据文件所在文件夹下（与启动程序时的当前目录无关）。
+    文件名为"文件键-内容键.npy"：文件键由文件名和所需列决定，同一文件保持不变；
+    内容键由文件前1MiB内容的哈希、修改时间、大小和解析规则版本决定，文件重新导出后随之改变。
+
+    Args:
+        file_path: 文件路径
+        mtime: 文件修改时间
+        size: 文件大小
+        columns: 读取的列名元组
+
+    Returns:
+        缓存文件路径
+    """
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_path)), CONFIG["RUNTIME_CONFIG"]["disk_cache_dir"])
+    file_key = hashlib.sha1(f"{os.path.basename(file_path)}|{'|'.join(columns)}".encode('utf-8')).hexdigest()[:16]
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(1 << 20))
+    digest.update(f"{mtime}|{size}|v{_CYCLE_PARSE_VERSION}".encode('utf-8'))
+    return os.path.join(cache_dir, f"{file_key}-{digest.hexdigest()}.npy")
+
+
+# 磁盘缓存写入失败时只提示一次（例如数据文件夹只读）
+_disk_cache_warned = False
+
+
+def _save_disk_cache(cache_path, values):
+    """写入磁盘缓存（先写临时文件再替换，避免并行进程读到半写入的文件），并删除同一文件的旧缓存
+
+    写入失败不影响处理，只在首次失败时打印提示。
+
+    Args:
+        cache_path: 缓存文件路径
+        values: 要缓存的数组
+    """
+    global _disk_cache_warned
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            np.save(f, values, allow_pickle=False)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if not _disk_cache_warned:
+            _disk_cache_warned = True
+            print(f"警告: 无法写入Cycle表磁盘缓存({os.path.dirname(cache_path)}): {e}，本次运行不使用磁盘缓存加速")
+        return
+
+    # 文件修改后内容键改变，删除该文件此前留下的缓存，使缓存大小不随重复导出增长
+    file_key = os.path.basename(cache_path).split('-', 1)[0]
+    for stale_path in glob.glob(os.path.join(os.path.dirname(cache_path), f"{file_key}-*.npy")):
+        if stale_path != cache_path:
+            try:
+                os.remove(stale_path)
+            except OSError:
+                pass
+
+
+def _load_cycle_sheet(file_path, mtime, size, columns, allow_missing=False, workbook=None):
+    """使用calamine原生接口读取Cycle表中需要的列（优先使用磁盘缓存）
+
+    Args:
+        file_path: 文件路径
+        mtime: 文件修改时间（磁盘缓存键的一部分，文件变化后缓存自动失效）
+        size: 文件大小（同上）
+        columns: 需要读取的列名元组
+        allow_missing: 为True时缺少的列以NaN填充，否则抛出ValueError
+        workbook: 调用方已打开的CalamineWorkbook，None时临时打开并在读取后关闭
+
+    Returns:
+        只读float64二维数组，每行一个循环，列顺序同columns（列优先存储）
+    """
+    cache_path = None
+    if CONFIG["RUNTIME_CONFIG"]["disk_cache_enabled"]:
+        cache_path = _disk_cache_path(file_path, mtime, size, columns)
+        try:
+            block = np.load(cache_path, allow_pickle=False)
+            block.flags.writeable = False
+            return block
+        except (OSError, ValueError):
+            pass  # 未命中或缓存损坏，重新解析
+
+    if workbook is None:
+        with python_calamine.CalamineWorkbook.from_path(file_path) as workbook:
+            return _load_cycle_sheet(file_path, mtime, size, columns, allow_missing, workbook)
+
+    sheet = workbook.get_sheet_by_name(CONFIG['cycle_sheet_name'])
+    rows = sheet.iter_rows()
+    header = next(rows, None)
+    if header is None:
+        return np.empty((0, len(columns)), dtype=np.float64)
+
+    # 在表头中定位需要的列（缺少的列索引记为-1，读出为空）
+    header = [str(cell).strip() for cell in header]
+    missing = [col for col in columns if col not in header]
+    if missing and not allow_missing:
+        raise ValueError(f"Cycle表缺少列: {missing}")
+    col_indices = [header.index(col) if col in header else -1 for col in columns]
+
+    # 按表高预分配（列优先，保证每列连续），逐行读取时只取选中列写入，不生成整表的中间列表
+    # 全空行与read_excel一致保留为NaN行；以文本存储的数字同样转换为数值
+    values = np.full((max(sheet.height - 1, 0), len(col_indices)), np.nan, order='F')
+    count = 0
+    for row in rows:
+        cells = [row[i] if 0 <= i < len(row) else '' for i in col_indices]
+        values[count] = [cell if isinstance(cell, (int, float)) else _text_to_float(cell) for cell in cells]
+        count += 1
+
+    # 缓存的数组被多处共享，设为只读防止误改
+    block = values[:count]
+    block.flags.writeable = False
+    if cache_path is not None:
+        _save_disk_cache(cache_path, block)
+    return block
+
+
+# 本次运行已读取的Cycle表，键为(路径, 修改时间, 大小, 列, allow_missing)，超出上限时淘汰最早加入的
+_cycle_sheet_cache = {}
+_CYCLE_SHEET_CACHE_SIZE = 512
+
+
+def _read_cycle_sheet(file_path, columns=None, allow_missing=False, workbook=None):
+    """读取Cycle表需要的列，以(路径, 修改时间, 大小, 列)为键命中缓存，同一次运行中重复读取同一文件不再解析
+
+    Args:
+        file_path: 文件路径
+        columns: 需要读取的列名序列，None表示CONFIG["CYCLE_SHEET_COLS"]
+        allow_missing: 同_load_cycle_sheet
+        workbook: 同_load_cycle_sheet
+
+    Returns:
+        同_load_cycle_sheet
+    """
+    stat = os.stat(file_path)
+    columns = tuple(CONFIG["CYCLE_SHEET_COLS"] if columns is None else columns)
+    key = (file_path, stat.st_mtime, stat.st_size, columns, allow_missing)
+    block = _cycle_sheet_cache.get(key)
+    if block is None:
+        block = _load_cycle_sheet(file_path, stat.st_mtime, stat.st_size, columns, allow_missing, workbook)
+        if len(_cycle_sheet_cache) >= _CYCLE_SHEET_CACHE_SIZE:
+            del _cycle_sheet_cache[next(iter(_cycle_sheet_cache))]
+        _cycle_sheet_cache[key] = block
+    return block
+
 class BatteryDataProcessor:
     """电池数据处理器"""
 
@@ -353,12 +849,12 @@ class BatteryDataProcessor:
         self.folder_path = folder_path
 
         # 初始化日志系统
-        self.logger = ProcessingLogger(folder_path)
+        self.logger = ProcessingLogger(folder_path, CONFIG["RUNTIME_CONFIG"]["log_level"])
 
         # 记录初始化信息到调试日志
         self.logger.log_debug("BatteryDataProcessor初始化开始")
-        self.logger.log_debug(f"文件夹路径: {folder_path}")
-        self.logger.log_debug(f"配置信息: {CONFIG}")
+        self.logger.log_debug("文件夹路径: %s", folder_path)
+        self.logger.log_debug("配置信息: %s", CONFIG)
 
         # 配置绘图环境
         self._setup_plot_environment()
@@ -367,16 +863,30 @@ class BatteryDataProcessor:
         self._setup_pandas_display()
 
         # 初始化数据容器
-        self.first_cycle_files = []  # 仅1圈的文件
-        self.error_files = []  # 异常数据文件
+        self.first_cycle_files = []  # 仅1圈的文件，元素为(文件路径, 系列, 首圈结果行)
+        self.error_files = []  # 异常数据文件，元素同上
 
-        # 结果数据框
-        self.all_cycle_data = pd.DataFrame(columns=CONFIG["EXCEL_COLS"]['main'])
-        self.all_first_cycle = pd.DataFrame(columns=CONFIG["EXCEL_COLS"]['first_cycle'])
-        self.all_error_data = pd.DataFrame(columns=CONFIG["EXCEL_COLS"]['error'])
+        # 结果数据框（由处理流程从记录一次性构建，见_ensure_dataframes）
+        self.all_cycle_data = None
+        self.all_first_cycle = None
+        self.all_error_data = None
         self.statistics_data = pd.DataFrame()
         self.inconsistent_data = pd.DataFrame()
 
+        # 结果记录缓冲（逐行累积，处理结束后一次性构建DataFrame）
+        self._cycle_records = []
+        self._first_cycle_records = []
+        self._error_records = []
+
+        # 按统一批次分组的行位置缓存（数据框, 行数, {统一批次: 行位置数组}），异常检测和分布图共用
+        self._batch_indices = None
+
+        # 数据文件夹索引缓存（文件夹路径, {(主机, 通道): 文件名}），参考通道选择时按通道查找文件
+        self._folder_index = None
+
+        # 保留率曲线比较图的可复用Figure（多个批次依次绘制时清空后复用）
+        self._retention_fig = None
+
         # 输出配置
         self.verbose = CONFIG["RUNTIME_CONFIG"]["verbose"]  # 控制详细输出
 
@@ -389,6 +899,7 @@ class BatteryDataProcessor:
 
         plt.rcParams['font.sans-serif'] = [CONFIG["PLOT_CONFIG"]["font_family"]]
         plt.rcParams['axes.unicode_minus'] = False
+        plt.rcParams['agg.path.chunksize'] = 10000  # 长折线分块渲染，避免大数据量时渲染过慢
         plt.rc("font", family=CONFIG["PLOT_CONFIG"]["font_family"], size=str(CONFIG["PLOT_CONFIG"]["font_size"]))
 
         # 关闭交互模式，避免图片弹窗
@@ -400,6 +911,35 @@ class BatteryDataProcessor:
         pd.set_option('display.max_columns', None)
         pd.set_option('display.max_rows', None)
 
+    def _get_batch_indices(self, data):
+        """返回按统一批次分组的行位置字典（按批次排序），同一数据框只分组一次
+
+        Args:
+            data: 含统一批次列的DataFrame
+
+        Returns:
+            dict: 统一批次 -> 行位置数组
+        """
+        cached = self._batch_indices
+        if cached is not None and cached[0] is data and cached[1] == len(data):
+            return cached[2]
+
+        indices = dict(sorted(data.groupby('统一批次', observed=True).indices.items()))
+        self._batch_indices = (data, len(data), indices)
+        return indices
+
+    def _ensure_dataframes(self):
+        """确保结果数据框已构建，尚未处理的部分按已累积记录（可能为空）构建
+
+        在文件读取阶段与统计、绘图、导出阶段的交界处调用
+        """
+        if self.all_cycle_data is None:
+            self.all_cycle_data = pd.DataFrame(self._cycle_records, columns=CONFIG["EXCEL_COLS"]['main'])
+        if self.all_first_cycle is None:
+            self.all_first_cycle = pd.DataFrame(self._first_cycle_records, columns=CONFIG["EXCEL_COLS"]['first_cycle'])
+        if self.all_error_data is None:
+            self.all_error_data = pd.DataFrame(self._error_records, columns=CONFIG["EXCEL_COLS"]['error'])
+
     # ===== 核心处理方法 =====
     def process_all_files(self, file_groups):
         """处理所有电池数据文件
@@ -407,7 +947,21 @@ class BatteryDataProcessor:
         Args:
             file_groups: 按系列分组的文件路径列表字典
         """
+        # 所有系列共用一个进程池（文件总数较少时为None，串行处理），避免每个系列重复启动工作进程
+        executor = self._create_process_pool(sum(len(files) for files in file_groups.values()))
+        try:
+            self._process_file_groups(file_groups, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def _process_file_groups(self, file_groups, executor):
+        """逐个系列处理文件并汇总结果
 
+        Args:
+            file_groups: 按系列分组的文件路径列表字典
+            executor: 共用的进程池，None表示串行处理
+        """
         total_processed = 0
         total_successful = 0
 
@@ -422,132 +976,251 @@ class BatteryDataProcessor:
             results = []
             successful_files = 0
 
-            for file_path in tqdm(files, desc=f"正在处理{series_name}组数据", ncols=100):
+            # 限制进度条刷新频率，避免文件较小时终端重绘占用大量时间
+            for (status, payload), messages in tqdm(self._iter_file_results(_process_file_task, files, [series_name] * len(files),
+                                                                           executor=executor),
+                                                    total=len(files), desc=f"正在处理{series_name}组数据", ncols=100,
+                                                    miniters=max(1, len(files) // 100), mininterval=0.5):
+                # 输出该文件处理过程中的消息（经主进程stdout写入主要处理日志）
+                for message in messages:
+                    tqdm.write(message)
                 total_processed += 1
-                try:
-                    data = self._process_single_file(file_path, series_name)
-                    if data:
-                        results.append(data)
-                        successful_files += 1
-                        total_successful += 1
-                except Exception as e:
-                    if self.verbose:
-                        print(f"处理文件失败: {os.path.basename(file_path)}, 错误: {str(e)}")
+                if status == 'ok':
+                    results.append(payload)
+                    successful_files += 1
+                    total_successful += 1
+                elif status == 'first':
+                    self.first_cycle_files.append((payload[0], series_name, payload[1]))
+                elif status == 'error':
+                    self.error_files.append((payload[0], series_name, payload[1]))
 
             print(f"系列 {series_name} 处理完成: {successful_files}/{len(files)} 个文件成功处理")
 
             if results:
-                cycle_df = pd.DataFrame(results, columns=CONFIG["EXCEL_COLS"]['main'])
-                self.all_cycle_data = pd.concat([self.all_cycle_data, cycle_df], ignore_index=True)
+                self._cycle_records.extend(results)
                 print(f"系列 {series_name} 添加了 {len(results)} 条数据记录")
             else:
                 print(f"系列 {series_name} 没有有效数据")
 
+            # 每个系列处理完成后刷新一次输出
+            sys.stdout.flush()
+
+        # 所有系列处理完成后一次性构建结果数据框，并统一判定1C状态
+        self.all_cycle_data = pd.DataFrame(self._cycle_records, columns=CONFIG["EXCEL_COLS"]['main'])
+        self._classify_1c_status(self.all_cycle_data)
+
         print(f"\n数据处理总结:")
         print(f"总共处理文件: {total_processed} 个")
         print(f"成功处理文件: {total_successful} 个")
         print(f"总有效数据记录: {len(self.all_cycle_data)} 条")
 
-    def _process_single_file(self, file_path, series_name):
-        """处理单个电池数据文件
+    def _create_process_pool(self, n_tasks):
+        """任务数足够多且允许多进程时创建进程池
 
         Args:
-            file_path: 文件路径
+            n_tasks: 待处理的任务总数
+
+        Returns:
+            ProcessPoolExecutor；只允许单进程或任务数少于parallel_min_tasks时返回None（串行处理）
+        """
+        max_workers = min(CONFIG["RUNTIME_CONFIG"]["max_workers"] or os.cpu_count() or 1, n_tasks)
+        if max_workers <= 1 or n_tasks < CONFIG["RUNTIME_CONFIG"]["parallel_min_tasks"]:
+            return None
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=_init_file_worker, initargs=(CONFIG,))
+
+    def _iter_file_results(self, task, files, *task_args, executor=None):
+        """按输入顺序逐个返回处理结果，任务较多时使用多进程并行处理
+
+        Args:
+            task: 模块级任务函数，调用形式为 task(文件路径或任务数据, *参数, processor)
+            files: 文件路径列表（或其他可序列化的任务数据列表）
+            task_args: 与files等长的其他参数列表
+            executor: 调用方创建并负责关闭的进程池（多次调用共用）；None时按任务数决定是否自行创建
+
+        Returns:
+            生成器，按files顺序逐个产生task的返回值
+        """
+        done = 0
+        own_executor = executor is None
+        if own_executor:
+            executor = self._create_process_pool(len(files))
+
+        if executor is not None:
+            max_workers = CONFIG["RUNTIME_CONFIG"]["max_workers"] or os.cpu_count() or 1
+            chunksize = max(1, min(CONFIG["RUNTIME_CONFIG"]["chunk_size"], len(files) // max_workers))
+            try:
+                for item in executor.map(task, files, *task_args, chunksize=chunksize):
+                    done += 1
+                    yield item
+                return
+            except (BrokenProcessPool, OSError) as e:
+                print(f"多进程处理失败，剩余 {len(files) - done} 个文件改为串行处理: {str(e)}")
+            finally:
+                if own_executor:
+                    executor.shutdown()
+
+        # 串行处理（单进程、任务较少或多进程不可用时）
+        for args in list(zip(files, *task_args))[done:]:
+            yield task(*args, self)
+
+    def _process_single_file(self, file_path, series_name, file_name):
+        """处理单个电池数据文件：打开工作簿一次供Cycle表和test表共用，处理结束后立即关闭文件
+
+        Args:
+            file_path: 文件路径（由auto_detect_series枚举得到，不再重复检查是否存在）
             series_name: 系列名称
+            file_name: 文件名（调用方计算一次后传入）
 
         Returns:
-            处理后的数据或None（如文件异常）
+            同_process_workbook
         """
-        file_name = os.path.basename(file_path)
+        try:
+            workbook = python_calamine.CalamineWorkbook.from_path(file_path)
+        except Exception as e:
+            if self.verbose:
+                tqdm.write(f"无法读取文件: {file_name}, 错误: {str(e)}")
+            return ('skip', file_path)
 
-        # 检查文件是否存在
-        if not os.path.exists(file_path):
-            print(f"文件不存在: {file_path}")
-            return None
+        with workbook:
+            return self._process_workbook(workbook, file_path, series_name, file_name)
+
+    def _process_workbook(self, workbook, file_path, series_name, file_name):
+        """处理已打开的电池数据工作簿
+
+        Args:
+            workbook: 已打开的CalamineWorkbook
+            file_path: 文件路径
+            series_name: 系列名称
+            file_name: 文件名
 
+        Returns:
+            (状态, 数据) 元组：
+            ('ok', 结果行) 处理成功；('first', (文件路径, 首圈结果行)) 仅1个循环；
+            ('error', (文件路径, 首圈结果行)) 首圈数据异常；('skip', 文件路径) 文件无法处理
+            仅1圈和首圈异常文件的结果行在此直接提取，后续无需再次读取文件
+        """
         # 读取循环数据
         try:
-            # 尝试读取Excel文件
-            cycle_df = pd.read_excel(file_path, sheet_name=CONFIG['cycle_sheet_name'],
-                                 usecols=CONFIG["CYCLE_SHEET_COLS"], engine=CONFIG['excel_engine'])
+            # 尝试读取Excel文件（二维数组，列顺序同CYCLE_SHEET_COLS）
+            cycle_block = _read_cycle_sheet(file_path, workbook=workbook)
+            cycle_count = len(cycle_block)
 
             # 检查是否成功读取数据
-            if cycle_df.empty:
+            if cycle_count == 0:
                 if self.verbose:
-                    print(f"文件 {file_name} 的Cycle表为空")
-                return None
+                    tqdm.write(f"文件 {file_name} 的Cycle表为空")
+                return ('skip', file_path)
+
+            # 按列名访问的列视图，以及一次性取出的首圈数据行
+            cycle_arrays = {col: cycle_block[:, i] for col, i in _CYCLE_COL_IDX.items()}
+            first_row = cycle_block[0]
 
         except Exception as e:
             if self.verbose:
-                print(f"无法读取文件: {file_name}, 错误: {str(e)}")
-            return None
+                tqdm.write(f"无法读取文件: {file_name}, 错误: {str(e)}")
+            return ('skip', file_path)
 
         # 提取文件信息
         try:
-            file_info = self._extract_file_info(file_path)
+            file_info = self._extract_file_info(file_path, file_name, workbook)
             if file_info['device_id'] == 'error' or file_info['channel_id'] == 'error':
-                print(f"文件名格式不正确: {file_name}")
-                return None
+                tqdm.write(f"文件名格式不正确: {file_name}")
+                return ('skip', file_path)
         except Exception as e:
-            print(f"提取文件信息失败: {file_name}, 错误: {str(e)}")
-            return None
+            tqdm.write(f"提取文件信息失败: {file_name}, 错误: {str(e)}")
+            return ('skip', file_path)
 
         # 检查数据有效性
-        if len(cycle_df) == 1:
+        if cycle_count == 1:
             if self.verbose:
-                print(f"文件 {file_name} 只有1个循环，添加到first_cycle_files")
-            self.first_cycle_files.append((file_path, series_name))
-            return None
+                tqdm.write(f"文件 {file_name} 只有1个循环，添加到first_cycle_files")
+            return ('first', (file_path, self._build_first_cycle_row(cycle_block, file_info, series_name, False)))
 
         # 检查首圈数据是否异常
         try:
-            if self._is_abnormal_first_cycle(cycle_df):
-                print(f"文件 {file_name} 首圈数据异常，添加到error_files")
-                self.error_files.append((file_path, series_name))
-                return None
+            if self._is_abnormal_first_cycle(first_row):
+                if self.verbose:
+                    tqdm.write(f"文件 {file_name} 首圈数据异常，添加到error_files")
+                return ('error', (file_path, self._build_first_cycle_row(cycle_block, file_info, series_name, True)))
         except Exception as e:
-            print(f"检查首圈数据异常失败: {file_name}, 错误: {str(e)}")
-            return None
+            tqdm.write(f"检查首圈数据异常失败: {file_name}, 错误: {str(e)}")
+            return ('skip', file_path)
 
         # 处理循环数据
         try:
-            result = self._process_cycle_data(cycle_df, file_info, series_name)
+            result = self._process_cycle_data(cycle_arrays, first_row, file_info, series_name)
             if result:
-                print(f"文件 {file_name} 处理成功")
-                return result
+                if self.verbose:
+                    tqdm.write(f"文件 {file_name} 处理成功")
+                return ('ok', result)
             else:
-                print(f"文件 {file_name} 处理结果为空")
-                return None
+                tqdm.write(f"文件 {file_name} 处理结果为空")
+                return ('skip', file_path)
         except Exception as e:
-            print(f"处理循环数据失败: {file_name}, 错误: {str(e)}")
+            tqdm.write(f"处理循环数据失败: {file_name}, 错误: {str(e)}")
+            return ('skip', file_path)
+
+    def _read_active_mass(self, file_path, workbook=None):
+        """从test表中读取活性物质质量
+
+        Args:
+            file_path: 文件路径
+            workbook: 调用方已打开的CalamineWorkbook，None时临时打开并在读取后关闭
+
+        Returns:
+            活性物质质量，未找到时返回None
+        """
+        if workbook is None:
+            with python_calamine.CalamineWorkbook.from_path(file_path) as workbook:
+                return self._read_active_mass(file_path, workbook)
+
+        # 活性物质位于表头附近，只转换前50行
+        rows = workbook.get_sheet_by_name(CONFIG["test_sheet_name"]).to_python(nrows=50)
+        if not rows:
             return None
 
-    def _extract_file_info(self, file_path):
+        # 查找第一列为"活性物质"的行（首行为表头），取对应行的第二列值
+        for row in rows[1:]:
+            if len(row) >= 2 and row[0] == "活性物质":
+                return row[1] if row[1] != '' else None
+
+        # 尝试其他可能的列名
+        header = rows[0]
+        for col_name in ["活性物质", "活性物质质量", "质量", "mass"]:
+            if col_name in header and len(rows) > 1:
+                value = rows[1][header.index(col_name)]
+                return value if value != '' else None
+        return None
+
+    def _extract_file_info(self, file_path, file_name, workbook=None):
         """从文件路径中提取电池信息
 
         Args:
             file_path: 文件路径
+            file_name: 文件名
+            workbook: 已打开的CalamineWorkbook（读取活性物质用），None时临时打开
 
         Returns:
             包含电池信息的字典
         """
         try:
-            # 首先从完整路径中提取文件名
-            file_name = os.path.basename(file_path)
-            print(f"正在解析文件: {file_name}")
+            if self.verbose:
+                print(f"正在解析文件: {file_name}")
 
             # 使用文件名进行解析
             parts = file_name.split(sep='-')
             # 分割文件名，获取下划线分隔的部分
             underscore_parts = file_name.split(sep='_')
-            print(f"文件名分割结果: 破折号部分={len(parts)}个, 下划线部分={len(underscore_parts)}个")
+            if self.verbose:
+                print(f"文件名分割结果: 破折号部分={len(parts)}个, 下划线部分={len(underscore_parts)}个")
 
             # 使用统一的主机通道解析方法
             device_id, channel_id = self._extract_host_and_channel(file_name)
 
             # 如果解析失败，使用备用方案
             if not device_id or not channel_id:
-                print(f"主机通道解析失败，使用备用方案")
+                if self.verbose:
+                    print(f"主机通道解析失败，使用备用方案")
                 # 备用方案：尝试从文件名中提取设备ID
                 device_id = file_name.split('.')[0]  # 使用文件名作为设备ID
                 max_length = CONFIG["FILENAME_PARSE_CONFIG"]["device_id_max_length"]
@@ -555,7 +1228,7 @@ class BatteryDataProcessor:
                     device_id = device_id[:max_length]
 
                 # 备用通道ID
-                channel_match = re.search(r'CH[-_]?(\d+)', file_name, re.IGNORECASE)
+                channel_match = _CHANNEL_RE.search(file_name)
                 if channel_match:
                     channel_id = f"CH-{channel_match.group(1)}"
                 else:
@@ -564,7 +1237,8 @@ class BatteryDataProcessor:
             # 3. 批次ID提取 - 使用原始代码的下划线分割法
             try:
                 batch_id = self._extract_batch_like_original(file_name)
-                print(f"  提取的批次ID: {batch_id}")
+                if self.verbose:
+                    print(f"  提取的批次ID: {batch_id}")
             except Exception as e:
                 print(f"  批次提取失败: {str(e)}，使用默认值")
                 batch_id = CONFIG["FILENAME_PARSE_CONFIG"]["batch_id_prefix"] + file_name[:5]
@@ -580,26 +1254,31 @@ class BatteryDataProcessor:
                     if len(dash_parts) >= 2:
                         # 使用最后两个破折号部分
                         shelf_time = '-'.join(dash_parts[-2:])
-                        print(f"  使用空格前的最后两个破折号部分作为上架时间: {shelf_time}")
+                        if self.verbose:
+                            print(f"  使用空格前的最后两个破折号部分作为上架时间: {shelf_time}")
                     else:
                         # 只有一个部分，使用该部分
                         shelf_time = dash_parts[-1]
-                        print(f"  使用空格前的最后一个破折号部分作为上架时间: {shelf_time}")
+                        if self.verbose:
+                            print(f"  使用空格前的最后一个破折号部分作为上架时间: {shelf_time}")
                 else:
                     # 如果没有空格，尝试使用正则表达式查找日期格式
-                    date_match = re.search(r'(\d{4}[-/]?\d{2}[-/]?\d{2}|\d{6}|\d{2}\d{2})', file_name)
+                    date_match = _DATE_RE.search(file_name)
                     if date_match:
                         shelf_time = date_match.group(1)
-                        print(f"  使用正则表达式找到的日期作为上架时间: {shelf_time}")
+                        if self.verbose:
+                            print(f"  使用正则表达式找到的日期作为上架时间: {shelf_time}")
                     else:
                         # 如果没有找到日期格式，使用文件名中倒数第二个部分和最后一个部分
                         if len(parts) >= 2:
                             shelf_time = '-'.join(parts[-2:])
-                            print(f"  使用文件名中最后两个破折号部分作为上架时间: {shelf_time}")
+                            if self.verbose:
+                                print(f"  使用文件名中最后两个破折号部分作为上架时间: {shelf_time}")
                         else:
                             # 如果没有足够的部分，使用当前日期
                             shelf_time = time.strftime('%m%d', time.localtime())
-                            print(f"  使用当前日期作为上架时间: {shelf_time}")
+                            if self.verbose:
+                                print(f"  使用当前日期作为上架时间: {shelf_time}")
             except Exception as e:
                 print(f"  提取上架时间出错: {str(e)}，使用当前日期")
                 shelf_time = time.strftime('%m%d', time.localtime())
@@ -609,21 +1288,9 @@ class BatteryDataProcessor:
 
             # 6. 读取活性物质质量
             try:
-                test_df = pd.read_excel(file_path, sheet_name=CONFIG["test_sheet_name"], engine=CONFIG["excel_engine"])
-                # 查找包含"活性物质"的行
-                active_material_row = test_df[test_df.iloc[:, 0] == "活性物质"]
-                if not active_material_row.empty:
-                    mass = active_material_row.iloc[0, 1]  # 取对应行的第二列值
-                else:
-                    # 尝试其他可能的列名
-                    for col_name in ["活性物质", "活性物质质量", "质量", "mass"]:
-                        if col_name in test_df.columns:
-                            mass = test_df[col_name].iloc[0]
-                            break
-                    else:
-                        mass = None
+                mass = self._read_active_mass(file_path, workbook)
             except Exception as e:
-                print(f"读取活性物质失败: {os.path.basename(file_path)}, 错误: {str(e)}")
+                print(f"读取活性物质失败: {file_name}, 错误: {str(e)}")
                 mass = None
 
             result = {
@@ -635,14 +1302,15 @@ class BatteryDataProcessor:
                 'mass': mass
             }
 
-            print(f"文件信息提取结果: 设备={device_id}, 通道={channel_id}, 批次={batch_id}, 上架时间={shelf_time}, 模式={mode}")
+            if self.verbose:
+                print(f"文件信息提取结果: 设备={device_id}, 通道={channel_id}, 批次={batch_id}, 上架时间={shelf_time}, 模式={mode}")
             return result
 
         except Exception as e:
-            print(f"文件名解析错误: {os.path.basename(file_path)}, 错误: {str(e)}")
+            print(f"文件名解析错误: {file_name}, 错误: {str(e)}")
             # 提供默认值
             default_result = {
-                'device_id': CONFIG["FILENAME_PARSE_CONFIG"]["device_id_prefix"] + os.path.basename(file_path)[:10],
+                'device_id': CONFIG["FILENAME_PARSE_CONFIG"]["device_id_prefix"] + file_name[:10],
                 'channel_id': CONFIG["FILENAME_PARSE_CONFIG"]["default_channel"],
                 'batch_id': CONFIG["FILENAME_PARSE_CONFIG"]["batch_id_prefix"] + time.strftime('%m%d', time.localtime()),
                 'shelf_time': time.strftime('%m%d', time.localtime()),
@@ -652,44 +1320,39 @@ class BatteryDataProcessor:
             print(f"使用默认值: {default_result}")
             return default_result
 
-    def _identify_test_mode(self, file_path):
+    def _identify_test_mode(self, file_name):
         """识别测试模式
 
         Args:
-            file_path: 文件路径或文件名
+            file_name: 文件名（不含路径）
 
         Returns:
             测试模式标识
         """
-        # 确保使用文件名而不是完整路径
-        file_name = os.path.basename(file_path)
-
-        for pattern in CONFIG["MODE_CONFIG"]["patterns"]:
-            if pattern in file_name:
-                return pattern
+        found = _MODE_RE.findall(file_name)
+        if found:
+            return min(found, key=_MODE_PRIORITY.__getitem__)
         return '-1C-'  # 默认模式
 
-    def _is_abnormal_first_cycle(self, df):
+    def _is_abnormal_first_cycle(self, first_row):
         """检查首圈数据是否异常
 
         Args:
-            df: 循环数据DataFrame
+            first_row: 首圈数据行（列顺序同CYCLE_SHEET_COLS）
 
         Returns:
             布尔值，True表示异常
         """
-        first_charge = df.loc[0, '充电比容量(mAh/g)']
-        first_discharge = df.loc[0, '放电比容量(mAh/g)']
-
-        return (first_charge > CONFIG["ABNORMAL_THRESHOLDS"]['high_charge'] or
-                first_charge < CONFIG["ABNORMAL_THRESHOLDS"]['low_charge'] or
-                first_discharge < CONFIG["ABNORMAL_THRESHOLDS"]['low_discharge'])
+        return _is_abnormal(first_row[_CYCLE_COL_IDX['充电比容量(mAh/g)']],
+                            first_row[_CYCLE_COL_IDX['放电比容量(mAh/g)']],
+                            _HIGH_CHG, _LOW_CHG, _LOW_DIS)
 
-    def _process_cycle_data(self, df, file_info, series_name):
+    def _process_cycle_data(self, cycle, first_row, file_info, series_name):
         """处理循环数据
 
         Args:
-            df: 循环数据DataFrame
+            cycle: 循环数据列数组字典
+            first_row: 首圈数据行（列顺序同CYCLE_SHEET_COLS）
             file_info: 文件信息字典
             series_name: 系列名称
 
@@ -697,14 +1360,14 @@ class BatteryDataProcessor:
             处理后的数据列表
         """
         # 计算当前循环圈数（扣除最后1圈，从1开始）
-        total_cycles = len(df) - 1
+        total_cycles = len(cycle['放电比容量(mAh/g)']) - 1
 
-        # 首圈数据
+        # 首圈数据（在numpy边界处一次性转换为Python float，后续运算都走CPython快速路径）
         first_cycle = {
-            'charge': round(df.loc[0, '充电比容量(mAh/g)'], 1),
-            'discharge': round(df.loc[0, '放电比容量(mAh/g)'], 1),
-            'voltage': round(df.loc[0, '放电中值电压(V)'], 2),
-            'energy': round(df.loc[0, '放电比能量(mWh/g)'], 1)
+            'charge': round(float(first_row[_CYCLE_COL_IDX['充电比容量(mAh/g)']]), 1),
+            'discharge': round(float(first_row[_CYCLE_COL_IDX['放电比容量(mAh/g)']]), 1),
+            'voltage': round(float(first_row[_CYCLE_COL_IDX['放电中值电压(V)']]), 2),
+            'energy': round(float(first_row[_CYCLE_COL_IDX['放电比能量(mWh/g)']]), 1)
         }
         first_efficiency = round(first_cycle['discharge'] / first_cycle['charge'] * 100, 1)
 
@@ -712,13 +1375,13 @@ class BatteryDataProcessor:
         cycle_data = self._initialize_cycle_data()
 
         # 获取第2-4圈数据（如果存在）
-        self._extract_early_cycles_data(df, total_cycles, cycle_data)
+        self._extract_early_cycles_data(cycle, total_cycles, cycle_data)
 
         # 处理1C循环数据（自动识别1C首圈）
-        self._process_1c_data(df, total_cycles, cycle_data, file_info['mode'], first_cycle)
+        self._process_1c_data(cycle, total_cycles, cycle_data, file_info['mode'], first_cycle)
 
         # 处理当前循环和容量保持率数据
-        self._process_retention_data(df, total_cycles, cycle_data, file_info['mode'], first_cycle)
+        self._process_retention_data(cycle, total_cycles, cycle_data, file_info['mode'], first_cycle)
 
         # 构建结果数据
         result = [
@@ -739,6 +1402,27 @@ class BatteryDataProcessor:
 
         return result
 
+    def _classify_1c_status(self, df):
+        """向量化判定1C状态：优先判断过充，再细分首效；未识别1C首圈的样品保持为空
+
+        Args:
+            df: 循环数据DataFrame（将被修改）
+        """
+        if df.empty:
+            return
+
+        one_c_charge = pd.to_numeric(df['1C首充'], errors='coerce')
+        one_c_efficiency = pd.to_numeric(df['1C首效'], errors='coerce')
+        conditions = [
+            one_c_charge > _OVERCHARGE_THR,
+            one_c_efficiency < _VERY_LOW_EFF_THR,  # <80%: 首效过低
+            one_c_efficiency < _LOW_EFF_THR        # 80-85%: 首效低
+        ]
+        # 直接生成分类编码（-1表示空值），无需再从字符串推断类别
+        codes = np.select(conditions, [1, 2, 3], default=0)
+        codes[df['1C首圈编号'].isna().to_numpy()] = -1
+        df['1C状态'] = pd.Categorical.from_codes(codes, categories=_ONE_C_STATUS_CATEGORIES)
+
     def _initialize_cycle_data(self):
         """初始化循环数据字典
 
@@ -760,52 +1444,29 @@ class BatteryDataProcessor:
             '200容量保持': None, '200电压保持': None, '200能量保持': None
         }
 
-    def _extract_early_cycles_data(self, df, total_cycles, data):
+    def _extract_early_cycles_data(self, cycle, total_cycles, data):
         """提取前几个循环的数据
 
         Args:
-            df: 循环数据DataFrame
+            cycle: 循环数据列数组字典
             total_cycles: 总循环数
             data: 循环数据字典（将被修改）
         """
         # 更新当前圈数
         data['当前圈数'] = total_cycles
 
-        # 提取第2圈数据
-        if total_cycles >= 2:
-            data['Cycle2'] = round(df.loc[1, '放电比容量(mAh/g)'], 1)
-            data['Cycle2充电比容量'] = round(df.loc[1, '充电比容量(mAh/g)'], 1)
-
-        # 提取第3圈数据
-        if total_cycles >= 3:
-            data['Cycle3'] = round(df.loc[2, '放电比容量(mAh/g)'], 1)
-            data['Cycle3充电比容量'] = round(df.loc[2, '充电比容量(mAh/g)'], 1)
-
-        # 提取第4圈数据
-        if total_cycles >= 4:
-            data['Cycle4'] = round(df.loc[3, '放电比容量(mAh/g)'], 1)
-            data['Cycle4充电比容量'] = round(df.loc[3, '充电比容量(mAh/g)'], 1)
-
-        # 提取第5圈数据
-        if total_cycles >= 5:
-            data['Cycle5'] = round(df.loc[4, '放电比容量(mAh/g)'], 1)
-            data['Cycle5充电比容量'] = round(df.loc[4, '充电比容量(mAh/g)'], 1)
-
-        # 提取第6圈数据
-        if total_cycles >= 6:
-            data['Cycle6'] = round(df.loc[5, '放电比容量(mAh/g)'], 1)
-            data['Cycle6充电比容量'] = round(df.loc[5, '充电比容量(mAh/g)'], 1)
-
-        # 提取第7圈数据
-        if total_cycles >= 7:
-            data['Cycle7'] = round(df.loc[6, '放电比容量(mAh/g)'], 1)
-            data['Cycle7充电比容量'] = round(df.loc[6, '充电比容量(mAh/g)'], 1)
-
-    def _process_1c_data(self, df, total_cycles, data, mode, first_cycle):
+        # 提取第2-7圈数据（仅取存在的圈数），放电/充电两列一次性取整
+        last = min(7, total_cycles)
+        block = np.round(np.stack((cycle['放电比容量(mAh/g)'][1:last], cycle['充电比容量(mAh/g)'][1:last]), axis=1), 1)
+        for i in range(len(block)):
+            data[f'Cycle{i+2}'] = float(block[i, 0])
+            data[f'Cycle{i+2}充电比容量'] = float(block[i, 1])
+
+    def _process_1c_data(self, cycle, total_cycles, data, mode, first_cycle):
         """处理1C相关的循环数据，使用比值和差值双重验证识别1C首圈
 
         Args:
-            df: 循环数据DataFrame
+            cycle: 循环数据列数组字典
             total_cycles: 总循环数
             data: 循环数据字典（将被修改）
             mode: 测试模式
@@ -821,114 +1482,94 @@ class BatteryDataProcessor:
             print(f"  首圈效率: {(first_cycle['discharge']/first_cycle['charge']*100):.2f}%")
 
         # 仅在1C相关模式下识别1C首圈
-        if mode in CONFIG["MODE_CONFIG"]["one_c_modes"]:
+        if mode in _ONE_C_MODES:
             # 寻找前四圈中符合双重验证标准的循环作为1C首圈
             first_discharge = first_cycle['discharge']
+            discharge = cycle['放电比容量(mAh/g)']
+            charge = cycle['充电比容量(mAh/g)']
             one_c_start_idx = None
 
-            # 检查第2至第5圈
-            for idx in range(1, min(4, total_cycles)):
-                cycle_discharge = df.loc[idx, '放电比容量(mAh/g)']
-                cycle_charge = df.loc[idx, '充电比容量(mAh/g)']
-                cycle_efficiency = cycle_discharge / cycle_charge * 100
+            # 检查第2至第4圈，双重验证：同时满足比值和差值标准
+            last = min(4, total_cycles)
+            start_idx = _find_1c_start(discharge[:last], first_discharge, _RATIO_THR, _DIFF_THR)
+            if start_idx >= 0:
+                one_c_start_idx = start_idx
+                discharge_ratio = discharge[one_c_start_idx] / first_discharge
+                discharge_diff = first_discharge - discharge[one_c_start_idx]
 
-                # 双重验证：同时满足比值和差值标准
-                discharge_ratio = cycle_discharge / first_discharge
-                discharge_diff = first_discharge - cycle_discharge
-
-                # 输出比值和差值，便于调试
-                print(f"  第{idx+1}圈: 充电={cycle_charge:.2f}mAh/g, 放电={cycle_discharge:.2f}mAh/g, 效率={cycle_efficiency:.2f}%, 与首圈比值={discharge_ratio:.3f}, 差值={discharge_diff:.2f}mAh/g")
+            # 输出比值和差值，便于调试
+            if self.verbose:
+                for idx in range(1, (one_c_start_idx or last - 1) + 1):
+                    print(f"  第{idx+1}圈: 充电={charge[idx]:.2f}mAh/g, 放电={discharge[idx]:.2f}mAh/g, "
+                          f"效率={discharge[idx] / charge[idx] * 100:.2f}%, 与首圈比值={discharge[idx] / first_discharge:.3f}, "
+                          f"差值={first_discharge - discharge[idx]:.2f}mAh/g")
+                if one_c_start_idx is not None:
+                    print(f"  ** 自动识别1C首圈为第{one_c_start_idx+1}圈，比值={discharge_ratio:.3f}，差值={discharge_diff:.2f}mAh/g **")
 
-                # 同时满足两个条件判定为1C首圈 - 使用常量替代硬编码值
-                if discharge_ratio < CONFIG["ONE_C_THRESHOLDS"]["ratio_threshold"] and discharge_diff > CONFIG["ONE_C_THRESHOLDS"]["discharge_diff_threshold"]:
-                    one_c_start_idx = idx
-                    print(f"  ** 自动识别1C首圈为第{idx+1}圈，比值={discharge_ratio:.3f}，差值={discharge_diff:.2f}mAh/g **")
-                    break
+            # 如果未找到1C首圈，默认使用第4圈
+            one_c_idx = one_c_start_idx
+            if one_c_idx is None and total_cycles >= 4:
+                one_c_idx = 3
 
-            # 如果找到1C首圈
-            if one_c_start_idx is not None:
+            if one_c_idx is not None:
                 # 记录1C首圈编号（从1开始计数）
-                data['1C首圈编号'] = one_c_start_idx + 1
+                data['1C首圈编号'] = one_c_idx + 1
 
                 # 设置1C首圈数据
-                data['1C首充'] = round(df.loc[one_c_start_idx, '充电比容量(mAh/g)'], 1)
-                data['1C首放'] = round(df.loc[one_c_start_idx, '放电比容量(mAh/g)'], 1)
-                data['1C首效'] = round(100 * data['1C首放'] / data['1C首充'], 1)
+                data['1C首充'] = round(float(charge[one_c_idx]), 1)
+                data['1C首放'] = round(float(discharge[one_c_idx]), 1)
+                data['1C首效'] = round(100 * data['1C首放'] / data['1C首充'], 1) if data['1C首充'] else np.nan
 
                 # 计算1C倍率比
                 data['1C倍率比'] = round(100 * data['1C首放'] / first_cycle['discharge'], 2)
 
-                # 默认状态设为"正常"，确保没有None值
-                data['1C状态'] = "正常"
-
-                # 明确检查1C状态 - 修改判断顺序，优先判断过充 - 使用常量替代硬编码值
-                if data['1C首充'] > CONFIG["ONE_C_THRESHOLDS"]["overcharge_threshold"]:
-                    data['1C状态'] = '1C过充'
-                # 修改：细分首效状态 - 使用常量替代硬编码值
-                elif data['1C首效'] < CONFIG["ONE_C_THRESHOLDS"]["very_low_efficiency_threshold"]:
-                    data['1C状态'] = '首效过低'  # <80%: 首效过低
-                elif data['1C首效'] < CONFIG["ONE_C_THRESHOLDS"]["low_efficiency_threshold"]:
-                    data['1C状态'] = '首效低'     # 80-85%: 首效低
-
-                print(f"识别到1C首圈：第{one_c_start_idx+1}圈，放电比容量 {df.loc[one_c_start_idx, '放电比容量(mAh/g)']}，"
-                    f"与首圈比值 {discharge_ratio:.3f}，差值 {discharge_diff:.2f}mAh/g，状态为{data['1C状态']}")
+                # 1C状态在所有文件读取完成后由_classify_1c_status统一向量化判定
 
-            # 如果未找到1C首圈，默认使用第4圈
-            elif total_cycles >= 4:
-                data['1C首圈编号'] = 4  # 第4圈
-                data['1C首充'] = round(df.loc[3, '充电比容量(mAh/g)'], 1)
-                data['1C首放'] = round(df.loc[3, '放电比容量(mAh/g)'], 1)
-                data['1C首效'] = round(100 * data['1C首放'] / data['1C首充'], 1)
-                data['1C倍率比'] = round(100 * data['1C首放'] / first_cycle['discharge'], 2)
-
-                # 默认状态设为"正常"，确保没有None值
-                data['1C状态'] = "正常"
-
-                # 明确检查1C状态 - 修改判断顺序，优先判断过充 - 使用常量替代硬编码值
-                if data['1C首充'] > CONFIG["ONE_C_THRESHOLDS"]["overcharge_threshold"]:
-                    data['1C状态'] = '1C过充'
-                # 修改：细分首效状态 - 使用常量替代硬编码值
-                elif data['1C首效'] < CONFIG["ONE_C_THRESHOLDS"]["very_low_efficiency_threshold"]:
-                    data['1C状态'] = '首效过低'  # <80%: 首效过低
-                elif data['1C首效'] < CONFIG["ONE_C_THRESHOLDS"]["low_efficiency_threshold"]:
-                    data['1C状态'] = '首效低'     # 80-85%: 首效低
-
-                print(f"未找到同时满足比值(<{CONFIG['ONE_C_THRESHOLDS']['ratio_threshold']})和差值(>{CONFIG['ONE_C_THRESHOLDS']['discharge_diff_threshold']}mAh/g)条件的1C首圈，使用默认第4圈作为1C首圈，状态为{data['1C状态']}")
+                if self.verbose:
+                    if one_c_start_idx is not None:
+                        print(f"识别到1C首圈：第{one_c_idx+1}圈，放电比容量 {discharge[one_c_idx]}，"
+                            f"与首圈比值 {discharge_ratio:.3f}，差值 {discharge_diff:.2f}mAh/g，1C首效为{data['1C首效']}%")
+                    else:
+                        print(f"未找到同时满足比值(<{_RATIO_THR})和差值(>{_DIFF_THR}mAh/g)条件的1C首圈，使用默认第4圈作为1C首圈，1C首效为{data['1C首效']}%")
 
         # # 非1C模式但总循环数足够，仍计算倍率比（使用第4圈）
         # elif total_cycles >= 4:
-        #     data['1C倍率比'] = round(100 * df.loc[3, '放电比容量(mAh/g)'] / first_cycle['discharge'], 2)
+        #     data['1C倍率比'] = round(100 * discharge[3] / first_cycle['discharge'], 2)
 
-    def _process_retention_data(self, df, total_cycles, data, mode, first_cycle):
+    def _process_retention_data(self, cycle, total_cycles, data, mode, first_cycle):
         """处理容量保持率相关数据
 
         Args:
-            df: 循环数据DataFrame
+            cycle: 循环数据列数组字典
             total_cycles: 总循环数
             data: 循环数据字典（将被修改）
             mode: 测试模式
             first_cycle: 首圈数据字典
         """
-        # 记录1C状态，但不再基于它决定是否计算容量保持率
-        # 在"循环2圈以上"表格中记录容量保持率数据
-        if '1C状态' in data and (data['1C状态'] == '1C过充' or data['1C状态'] == '首效过低'):
-            print(f"  样品状态为{data['1C状态']}，但仍计算容量保持率以便于展示")
-            # 不再提前返回，继续执行计算
+        # 1C过充或首效过低的样品也计算容量保持率，以便在"循环2圈以上"表格中展示
 
         # 只有当圈数>4时才计算容量保持率
         if total_cycles <= 4:
-            print(f"  当前圈数({total_cycles})不超过4，不计算容量保持率")
+            if self.verbose:
+                print(f"  当前圈数({total_cycles})不超过4，不计算容量保持率")
             return
 
+        retention_cols = (cycle['放电比容量(mAh/g)'], cycle['放电中值电压(V)'], cycle['放电比能量(mWh/g)'])
+
+        def pull_rows(rows):
+            """一次取出所需各圈的(放电容量, 中值电压, 能量)，返回按圈排列的元组列表（保持numpy标量以沿用原有舍入结果）"""
+            return list(zip(*(col[rows] for col in retention_cols)))
+
         # 0.1C循环容量保持率计算
         if mode == '-0.1C-':
-            data['当前容量保持'] = round(100 * df.loc[total_cycles-1, '放电比容量(mAh/g)'] / first_cycle['discharge'], 1)
-            data['电压衰减率mV/周'] = round((first_cycle['voltage'] - df.loc[total_cycles-1, '放电中值电压(V)']) * 1000 / (total_cycles-1), 1)
-            data['当前电压保持'] = round(100 * df.loc[total_cycles-1, '放电中值电压(V)'] / first_cycle['voltage'], 1)
-            data['当前能量保持'] = round(100 * df.loc[total_cycles-1, '放电比能量(mWh/g)'] / first_cycle['energy'], 1)
+            (last_discharge, last_voltage, last_energy), = pull_rows([total_cycles-1])
+            data['当前容量保持'] = round(100 * last_discharge / first_cycle['discharge'], 1)
+            data['电压衰减率mV/周'] = round((first_cycle['voltage'] - last_voltage) * 1000 / (total_cycles-1), 1)
+            data['当前电压保持'] = round(100 * last_voltage / first_cycle['voltage'], 1)
+            data['当前能量保持'] = round(100 * last_energy / first_cycle['energy'], 1)
 
         # 1C循环容量保持率计算（使用动态识别的1C首圈）
-        elif mode in CONFIG["MODE_CONFIG"]["one_c_modes"]:
+        elif mode in _ONE_C_MODES:
             # 确定1C首圈索引
             one_c_idx = None
             if '1C首圈编号' in data and data['1C首圈编号'] is not None:
@@ -940,89 +1581,65 @@ class BatteryDataProcessor:
 
             # 确保有足够的循环数据
             if total_cycles > one_c_idx + 1:
+                # 动态计算100圈、200圈位置，与1C首圈、末圈一起一次取出
+                idx_100_cycles = one_c_idx + 100
+                idx_200_cycles = one_c_idx + 200
+                rows = [one_c_idx, total_cycles-1] + [idx for idx in (idx_100_cycles, idx_200_cycles) if total_cycles > idx]
+                pulled = pull_rows(rows)
+
                 # 获取1C首圈数据
-                one_c_discharge = df.loc[one_c_idx, '放电比容量(mAh/g)']
-                one_c_voltage = df.loc[one_c_idx, '放电中值电压(V)']
-                one_c_energy = df.loc[one_c_idx, '放电比能量(mWh/g)']
+                one_c_discharge, one_c_voltage, one_c_energy = pulled[0]
+                last_discharge, last_voltage, last_energy = pulled[1]
 
                 # 计算容量保持率
-                data['当前容量保持'] = round(100 * df.loc[total_cycles-1, '放电比容量(mAh/g)'] / one_c_discharge, 1)
-                data['电压衰减率mV/周'] = round((one_c_voltage - df.loc[total_cycles-1, '放电中值电压(V)']) * 1000 / (total_cycles-(one_c_idx+1)), 1)
-                data['当前电压保持'] = round(100 * df.loc[total_cycles-1, '放电中值电压(V)'] / one_c_voltage, 1)
-                data['当前能量保持'] = round(100 * df.loc[total_cycles-1, '放电比能量(mWh/g)'] / one_c_energy, 1)
-
-                # 动态计算100圈位置
-                idx_100_cycles = one_c_idx + 100
-                if total_cycles > idx_100_cycles:
-                    data['100容量保持'] = round(100 * df.loc[idx_100_cycles, '放电比容量(mAh/g)'] / one_c_discharge, 1)
-                    data['100电压保持'] = round(100 * df.loc[idx_100_cycles, '放电中值电压(V)'] / one_c_voltage, 1)
-                    data['100能量保持'] = round(100 * df.loc[idx_100_cycles, '放电比能量(mWh/g)'] / one_c_energy, 1)
+                data['当前容量保持'] = round(100 * last_discharge / one_c_discharge, 1)
+                data['电压衰减率mV/周'] = round((one_c_voltage - last_voltage) * 1000 / (total_cycles-(one_c_idx+1)), 1)
+                data['当前电压保持'] = round(100 * last_voltage / one_c_voltage, 1)
+                data['当前能量保持'] = round(100 * last_energy / one_c_energy, 1)
 
-                # 动态计算200圈位置
-                idx_200_cycles = one_c_idx + 200
-                if total_cycles > idx_200_cycles:
-                    data['200容量保持'] = round(100 * df.loc[idx_200_cycles, '放电比容量(mAh/g)'] / one_c_discharge, 1)
-                    data['200电压保持'] = round(100 * df.loc[idx_200_cycles, '放电中值电压(V)'] / one_c_voltage, 1)
-                    data['200能量保持'] = round(100 * df.loc[idx_200_cycles, '放电比能量(mWh/g)'] / one_c_energy, 1)
+                # 100圈、200圈保持率
+                for (cycle_discharge, cycle_voltage, cycle_energy), prefix in zip(pulled[2:], ('100', '200')):
+                    data[f'{prefix}容量保持'] = round(100 * cycle_discharge / one_c_discharge, 1)
+                    data[f'{prefix}电压保持'] = round(100 * cycle_voltage / one_c_voltage, 1)
+                    data[f'{prefix}能量保持'] = round(100 * cycle_energy / one_c_energy, 1)
 
     # ===== 特殊文件处理方法 =====
     def process_first_cycle_files(self):
-        """处理仅有1个循环的文件"""
+        """处理仅有1个循环的文件（结果行已在读取文件时提取）"""
         if not self.first_cycle_files:
             return
 
-        results = []
-        for file_path, series_name in tqdm(self.first_cycle_files, desc="正在处理仅1圈数据", ncols=100):
-            try:
-                df = pd.read_excel(file_path, sheet_name='Cycle',
-                                 usecols=['充电比容量(mAh/g)', '放电比容量(mAh/g)', '放电中值电压(V)'],
-                                 engine='calamine')
-
-                # 使用优化后的文件信息提取
-                file_info = self._extract_file_info(file_path)
-
-                first_charge = round(df.loc[0, '充电比容量(mAh/g)'], 2)
-                first_discharge = round(df.loc[0, '放电比容量(mAh/g)'], 2)
-
-                results.append([series_name, file_info['device_id'], file_info['channel_id'],
-                              file_info['batch_id'], file_info['shelf_time'], first_charge, first_discharge])
-            except Exception as e:
-                print(f"处理文件失败: {file_path}, 错误: {str(e)}")
-                continue
-
-        if results:
-            first_cycle_df = pd.DataFrame(results, columns=CONFIG["EXCEL_COLS"]['first_cycle'])
-            self.all_first_cycle = pd.concat([self.all_first_cycle, first_cycle_df], ignore_index=True)
+        self._first_cycle_records.extend(row for _, _, row in self.first_cycle_files)
+        self.all_first_cycle = pd.DataFrame(self._first_cycle_records, columns=CONFIG["EXCEL_COLS"]['first_cycle'])
 
     def process_error_files(self):
-        """处理异常数据文件"""
+        """处理异常数据文件（结果行已在读取文件时提取）"""
         if not self.error_files:
             return
 
-        results = []
-        for file_path, series_name in tqdm(self.error_files, desc="正在处理异常数据", ncols=100):
-            try:
-                df = pd.read_excel(file_path, sheet_name='Cycle',
-                                 usecols=['充电比容量(mAh/g)', '放电比容量(mAh/g)', '放电中值电压(V)'],
-                                 engine='calamine')
+        self._error_records.extend(row for _, _, row in self.error_files)
+        self.all_error_data = pd.DataFrame(self._error_records, columns=CONFIG["EXCEL_COLS"]['error'])
 
-                # 使用优化后的文件信息提取
-                file_info = self._extract_file_info(file_path)
+    def _build_first_cycle_row(self, cycle_block, file_info, series_name, include_total_cycles):
+        """由已读取的Cycle表数据构建仅1圈文件或首圈异常文件的首圈结果行
 
-                first_charge = round(df.loc[0, '充电比容量(mAh/g)'], 2)
-                first_discharge = round(df.loc[0, '放电比容量(mAh/g)'], 2)
-                total_cycles = len(df) - 1
+        Args:
+            cycle_block: Cycle表二维数组（列顺序同CYCLE_SHEET_COLS）
+            file_info: 文件信息字典
+            series_name: 系列名称
+            include_total_cycles: 是否在结果末尾附加当前圈数（异常文件表需要）
 
-                results.append([series_name, file_info['device_id'], file_info['channel_id'],
-                              file_info['batch_id'], file_info['shelf_time'], first_charge,
-                              first_discharge, total_cycles])
-            except Exception as e:
-                print(f"处理文件失败: {file_path}, 错误: {str(e)}")
-                continue
+        Returns:
+            结果行列表
+        """
+        first_charge = round(cycle_block[0, _CYCLE_COL_IDX['充电比容量(mAh/g)']], 2)
+        first_discharge = round(cycle_block[0, _CYCLE_COL_IDX['放电比容量(mAh/g)']], 2)
 
-        if results:
-            error_df = pd.DataFrame(results, columns=CONFIG["EXCEL_COLS"]['error'])
-            self.all_error_data = pd.concat([self.all_error_data, error_df], ignore_index=True)
+        row = [series_name, file_info['device_id'], file_info['channel_id'],
+               file_info['batch_id'], file_info['shelf_time'], first_charge, first_discharge]
+        if include_total_cycles:
+            row.append(len(cycle_block) - 1)
+        return row
 
     # ===== 数据统计方法 =====
     def calculate_statistics(self, use_multi_feature=True):
@@ -1033,6 +1650,7 @@ class BatteryDataProcessor:
         """
         # 保存参数供内部方法使用
         self._use_multi_feature = use_multi_feature
+        self._ensure_dataframes()
         if self.all_cycle_data.empty:
             # 即使没有数据，也创建一个空的统计数据DataFrame
             self.statistics_data = pd.DataFrame(columns=CONFIG["EXCEL_COLS"].get('statistics',
@@ -1041,16 +1659,22 @@ class BatteryDataProcessor:
             print("没有循环数据，创建空的统计数据DataFrame")
             return
 
-        # 添加统一批次列 - 从批次中提取统一批次
-        self.all_cycle_data['统一批次'] = self.all_cycle_data['批次'].apply(self._extract_unified_batch)
+        # 添加统一批次列 - 从批次中提取统一批次（每个不同批次只解析一次，直接生成分类类型，
+        # 后续按统一批次的分组和排序都只比较整数编码）
+        batches = self.all_cycle_data['批次']
+        unified_batches = {batch: self._extract_unified_batch(batch) for batch in batches.unique()}
+        self.all_cycle_data['统一批次'] = pd.Categorical(batches.map(unified_batches))
+        self._batch_indices = None  # 统一批次已重新计算，分组缓存失效
+
+        # 其余重复取值较少的分组列也转为分类类型，减少内存并加快后续分组
+        for col in ('系列', '主机'):
+            self.all_cycle_data[col] = self.all_cycle_data[col].astype('category')
 
         # 打印批次和统一批次的对应关系，帮助调试
         if self.verbose:
             print("\n批次和统一批次的对应关系:")
             batch_mapping = {}
-            for idx, row in self.all_cycle_data.iterrows():
-                batch = row['批次']
-                unified_batch = row['统一批次']
+            for batch, unified_batch in zip(self.all_cycle_data['批次'], self.all_cycle_data['统一批次']):
                 if batch not in batch_mapping:
                     batch_mapping[batch] = unified_batch
                     print(f"  批次: {batch}")
@@ -1059,11 +1683,11 @@ class BatteryDataProcessor:
 
             # 按统一批次分组，显示每个统一批次下的通道
             print("\n按统一批次分组的通道:")
-            for unified_batch, group in self.all_cycle_data.groupby('统一批次'):
+            for unified_batch, group in self.all_cycle_data.groupby('统一批次', observed=True):
                 channels = group[['主机', '通道']].drop_duplicates()
                 print(f"\n统一批次: {unified_batch}, 包含 {len(channels)} 个通道")
-                for i, (_, row) in enumerate(channels.iterrows()):
-                    print(f"  {i+1}. 主机={row['主机']}, 通道={row['通道']}")
+                for i, (host, channel) in enumerate(zip(channels['主机'], channels['通道'])):
+                    print(f"  {i+1}. 主机={host}, 通道={channel}")
 
 
 
@@ -1076,8 +1700,9 @@ class BatteryDataProcessor:
             filtered_data, completely_removed_batches = self._remove_outliers_zscore_mad(self.all_cycle_data)
 
             # 生成Z-score分布图（如果配置允许）
-            if (hasattr(self, 'folder_path') and self.folder_path and
-                CONFIG["OUTLIER_DETECTION"]['zscore_mad'].get('generate_plots', True)):
+            if not CONFIG["OUTLIER_DETECTION"]['zscore_mad'].get('generate_plots', False):
+                print("未启用Z-score分布图生成，已跳过（可在配置中开启generate_plots）")
+            elif hasattr(self, 'folder_path') and self.folder_path:
                 try:
                     self._generate_zscore_distribution_plots(self.all_cycle_data, self.folder_path)
                 except Exception as e:
@@ -1109,73 +1734,84 @@ class BatteryDataProcessor:
         # 修改: 分析被完全剔除的批次，更新异常判断标准
         problem_batches = []
 
-        for batch in completely_removed_batches:
-            batch_data = self.all_cycle_data[self.all_cycle_data['统一批次'] == batch]
-
-            # 如果批次为空，跳过
-            if batch_data.empty:
-                continue
+        if completely_removed_batches:
+            # 修改: 计算各类异常样品比例，考虑三级首效状态 - 整表一次构建掩码，再按批次汇总计数
+            status = self.all_cycle_data['1C状态']
+            efficiency = self.all_cycle_data['首效']
+            very_low_eff = (status == '首效过低') | ((efficiency < _VERY_LOW_EFF_THR) & efficiency.notna())
+            overcharge = status == '1C过充'
+            # 注意：首效低(80-85%)的样品只影响参考通道选择，在_calculate_cycle_statistics方法中处理
+            batch_counts = pd.DataFrame({
+                'very_low': very_low_eff, 'overcharge': overcharge, 'total': 1
+            }).groupby(self.all_cycle_data['统一批次'], observed=True).sum()
+
+            for batch in completely_removed_batches:
+                # 如果批次为空，跳过
+                if batch not in batch_counts.index:
+                    continue
+                very_low_eff_count, overcharge_count, total_count = (int(v) for v in batch_counts.loc[batch])
 
-            # 修改: 计算各类异常样品比例，考虑三级首效状态 - 使用常量替代硬编码值
-            very_low_eff_count = sum(
-                (batch_data['1C状态'] == '首效过低') |
-                ((batch_data['首效'] < CONFIG["ONE_C_THRESHOLDS"]["very_low_efficiency_threshold"]) & pd.notna(batch_data['首效']))
-            )
-            # 计算首效低的样品数量
-            low_eff_count = sum(
-                (batch_data['1C状态'] == '首效低') |
-                ((batch_data['首效'] >= CONFIG["ONE_C_THRESHOLDS"]["very_low_efficiency_threshold"]) & (batch_data['首效'] < CONFIG["ONE_C_THRESHOLDS"]["low_efficiency_threshold"]) & pd.notna(batch_data['首效']))
-            )
-            # 注意：这里只计算数量，而在_calculate_cycle_statistics方法中会创建low_eff_samples DataFrame
-            overcharge_count = sum(batch_data['1C状态'] == '1C过充')
-            total_count = len(batch_data)
-
-            # 判断是否为真正的问题批次 (超过50%样品异常)
-            # 修改: 只计算严重异常(过充或首效过低<80%)的比例
-            if total_count > 0 and (very_low_eff_count + overcharge_count) / total_count > 0.5:
-                problem_batches.append(batch)
-                print(f"批次{batch}有{very_low_eff_count}个首效过低(<{CONFIG['ONE_C_THRESHOLDS']['very_low_efficiency_threshold']}%)样品和{overcharge_count}个过充样品，"
-                    f"占总数{total_count}的{(very_low_eff_count + overcharge_count)*100/total_count:.1f}%")
+                # 判断是否为真正的问题批次 (超过50%样品异常)
+                # 修改: 只计算严重异常(过充或首效过低<80%)的比例
+                if total_count > 0 and (very_low_eff_count + overcharge_count) / total_count > 0.5:
+                    problem_batches.append(batch)
+                    print(f"批次{batch}有{very_low_eff_count}个首效过低(<{_VERY_LOW_EFF_THR}%)样品和{overcharge_count}个过充样品，"
+                        f"占总数{total_count}的{(very_low_eff_count + overcharge_count)*100/total_count:.1f}%")
 
         # 按原始代码的方式处理数据：遍历所有原始批次，检查过滤后是否存在
         result_data = []
+        inconsistent_parts = []  # 需要复测的批次数据，循环结束后一次性合并
+
+        # 所有批次的基本统计值一次分组聚合得到
+        basic_stats = self._calculate_basic_statistics(filtered_data)
 
         # 获取所有批次
         all_series_batches = set(zip(self.all_cycle_data['系列'], self.all_cycle_data['统一批次']))
 
+        # 过滤前后的数据各分组一次，循环中按(系列, 统一批次)直接取组，不再逐批次扫描整表
+        keys = ['系列', '统一批次']
+        filtered_groups = filtered_data.groupby(keys, sort=False, observed=True)
+        all_groups = self.all_cycle_data.groupby(keys, sort=False, observed=True)
+
         # 对每个批次进行处理
         for series, batch in all_series_batches:
             # 检查过滤后的数据中是否有这个批次
-            group_mask = (filtered_data['系列'] == series) & (filtered_data['统一批次'] == batch)
+            try:
+                group = filtered_groups.get_group((series, batch))
+            except KeyError:
+                group = None
 
-            if not filtered_data[group_mask].empty:
+            if group is not None and not group.empty:
                 # 批次数据正常，计算统计值
-                group = filtered_data[group_mask]
-                stats = self._calculate_basic_statistics(series, batch, group)
+                stats = dict(basic_stats[(series, batch)])
                 self._calculate_cycle_statistics(stats, group)
                 result_data.append(stats)
             else:
                 # 批次数据异常，需要复测
                 # 区分是真正的问题批次还是数据波动大
-                mask = ((self.all_cycle_data['系列'] == series) &
-                    (self.all_cycle_data['统一批次'] == batch))
-                inconsistent = self.all_cycle_data[mask]
+                try:
+                    inconsistent = all_groups.get_group((series, batch))
+                except KeyError:
+                    inconsistent = self.all_cycle_data.iloc[0:0]
 
                 # 添加到首放一致性差待复测表
-                self.inconsistent_data = pd.concat(
-                    [self.inconsistent_data, inconsistent], ignore_index=True)
+                inconsistent_parts.append(inconsistent)
 
                 # 根据批次分析结果输出原因
                 if batch in problem_batches:
-                    print(f"批次{batch}(系列{series})由于异常高比例(>50%)的严重低首效(<{CONFIG['ONE_C_THRESHOLDS']['very_low_efficiency_threshold']}%)或过充被归类为需要复测")
+                    print(f"批次{batch}(系列{series})由于异常高比例(>50%)的严重低首效(<{_VERY_LOW_EFF_THR}%)或过充被归类为需要复测")
                 else:
                     print(f"批次{batch}(系列{series})数据波动过大被归类为需要复测")
 
+        if inconsistent_parts:
+            self.inconsistent_data = pd.concat(
+                [self.inconsistent_data, *inconsistent_parts], ignore_index=True)
+
         # 转换为DataFrame并排序
         if result_data:
             self.statistics_data = pd.DataFrame(result_data)
-            self.statistics_data = self.statistics_data.sort_values(['系列', '统一批次'], ascending=True)
-            self.statistics_data.index = range(1, len(self.statistics_data) + 1)
+            self.statistics_data = self.statistics_data.sort_values(['系列', '统一批次'], ascending=True, kind='stable', ignore_index=True)
+            self.statistics_data.index = pd.RangeIndex(1, len(self.statistics_data) + 1)
             print(f"成功生成统计数据，共{len(self.statistics_data)}行")
         else:
             # 即使没有有效的统计数据，也创建一个空的DataFrame
@@ -1220,91 +1856,103 @@ class BatteryDataProcessor:
 
         shrink_factor = CONFIG["OUTLIER_DETECTION"].get('boxplot_shrink_factor', 0.95)
 
+        # 未设置极差阈值时不会剔除任何样品，直接返回（与分组结果一致，不含统一批次为空的行），无需逐批次拆分再合并
+        if max_range is None:
+            if self.verbose:
+                print(f"\n未设置{column}的极差阈值，保留所有数据")
+            return df[df['统一批次'].notna()], []
+
         # 调试输出：开始异常值检测
         if self.verbose:
             print(f"\n开始使用改良箱线图法检测{column}列的异常值，极差阈值={max_range}")
             print(f"处理前的数据行数: {len(df)}")
             print(f"处理前的通道数量: {len(df[['主机', '通道']].drop_duplicates())}")
 
-        result_df = pd.DataFrame(columns=df.columns)
+        result_parts = []  # 各批次保留的数据，循环结束后一次性合并
         completely_removed_batches = []
         removed_channels = []  # 记录被剔除的通道
 
         # 按批次分组处理
-        for batch, group_df in df.groupby('统一批次'):
+        for batch, group_df in df.groupby('统一批次', sort=False, observed=True):
             # 调试输出：当前处理的批次
             if self.verbose:
                 print(f"\n处理批次: {batch}, 包含 {len(group_df)} 个样品")
                 print(f"批次 {batch} 的通道列表:")
-                for i, (_, row) in enumerate(group_df[['主机', '通道']].drop_duplicates().iterrows()):
-                    print(f"  {i+1}. 主机={row['主机']}, 通道={row['通道']}")
+                channels = group_df[['主机', '通道']].drop_duplicates()
+                for i, (host, channel) in enumerate(zip(channels['主机'], channels['通道'])):
+                    print(f"  {i+1}. 主机={host}, 通道={channel}")
 
             # 如果只有一个样品，则保留
             if len(group_df) <= 1:
-                result_df = pd.concat([result_df, group_df])
+                result_parts.append(group_df)
                 continue
 
-            # 使用改良箱线图法
-            if max_range is not None:
-                # 初始化
-                filtered_df = group_df.copy()
-                current_range = filtered_df[column].max() - filtered_df[column].min()
-                iteration = 0
-                max_iterations = CONFIG["RUNTIME_CONFIG"]["max_iterations"]  # 最大迭代次数
-
-                # 调试输出
-                if self.verbose:
-                    print(f"  使用改良箱线图法，初始极差={current_range:.2f}, 目标极差={max_range}")
-
-                # 迭代直到满足极差要求或达到最大迭代次数
-                while current_range > max_range and iteration < max_iterations and len(filtered_df) > 1:
-                    iteration += 1
-                    prev_size = len(filtered_df)
-
-                    # 计算四分位数
-                    q1, q3 = filtered_df[column].quantile([0.25, 0.75])
-                    iqr = q3 - q1
-
-                    # 计算边界
-                    lower_bound = q1 - iqr * (shrink_factor ** iteration)
-                    upper_bound = q3 + iqr * (shrink_factor ** iteration)
-
-                    # 调试输出
-                    if self.verbose:
-                        print(f"  迭代 {iteration}: Q1={q1:.2f}, Q3={q3:.2f}, IQR={iqr:.2f}")
-                        print(f"  边界: [{lower_bound:.2f}, {upper_bound:.2f}]")
+            # 使用改良箱线图法：在numpy数组上迭代，只记录保留行的位置，最后一次性取出
+            values = group_df[column].to_numpy(dtype=np.float64)
+            positions = np.arange(len(values))
+            valid = values[~np.isnan(values)]
+            current_range = valid.max() - valid.min() if len(valid) else np.nan
+            iteration = 0
+            max_iterations = CONFIG["RUNTIME_CONFIG"]["max_iterations"]  # 最大迭代次数
 
-                    # 过滤数据
-                    outliers_before = filtered_df[~filtered_df[column].between(lower_bound, upper_bound)]
-                    filtered_df = filtered_df[filtered_df[column].between(lower_bound, upper_bound)]
+            # 调试输出
+            if self.verbose:
+                print(f"  使用改良箱线图法，初始极差={current_range:.2f}, 目标极差={max_range}")
 
-                    # 记录被剔除的通道
-                    for _, row in outliers_before.iterrows():
-                        removed_channels.append((row['主机'], row['通道']))
+            # 初始极差已满足要求（或整列为空）时无需迭代，直接保留整个批次
+            if not current_range > max_range:
+                result_parts.append(group_df)
+                if self.verbose:
+                    print(f"  初始极差已满足要求，批次 {batch} 保留了 {len(group_df)} 个样品")
+                continue
 
-                    # 计算新的极差
-                    if not filtered_df.empty:
-                        current_range = filtered_df[column].max() - filtered_df[column].min()
+            # 迭代直到满足极差要求或达到最大迭代次数，收缩系数每次迭代累乘
+            shrink = 1.0
+            while current_range > max_range and iteration < max_iterations and len(values) > 1:
+                iteration += 1
+                prev_size = len(values)
+                shrink *= shrink_factor
 
-                    # 调试输出
-                    if self.verbose and not outliers_before.empty:
-                        print(f"  剔除了 {len(outliers_before)} 个异常值:")
-                        for _, row in outliers_before.iterrows():
-                            print(f"    异常值: 主机={row['主机']}, 通道={row['通道']}, {column}={row[column]:.2f}")
+                # 计算四分位数（忽略空值，与Series.quantile一致）
+                q1, q3 = np.nanquantile(values, [0.25, 0.75])
+                iqr = q3 - q1
 
-                    # 如果没有点被剔除，退出循环
-                    if len(filtered_df) == prev_size:
-                        break
+                # 计算边界
+                lower_bound = q1 - iqr * shrink
+                upper_bound = q3 + iqr * shrink
 
                 # 调试输出
                 if self.verbose:
-                    print(f"  最终极差={current_range:.2f}, 迭代次数={iteration}")
+                    print(f"  迭代 {iteration}: Q1={q1:.2f}, Q3={q3:.2f}, IQR={iqr:.2f}")
+                    print(f"  边界: [{lower_bound:.2f}, {upper_bound:.2f}]")
+
+                # 过滤数据（空值比较结果为False，与between一致会被剔除）
+                keep = (values >= lower_bound) & (values <= upper_bound)
+                outlier_positions = positions[~keep]
+                values = values[keep]
+                positions = positions[keep]
+
+                # 计算新的极差
+                if len(values):
+                    current_range = values.max() - values.min()
+
+                # 调试输出：记录被剔除的通道（仅详细模式下需要）
+                if self.verbose and len(outlier_positions):
+                    outliers_before = group_df.iloc[outlier_positions]
+                    removed_channels.extend(zip(outliers_before['主机'], outliers_before['通道']))
+                    print(f"  剔除了 {len(outliers_before)} 个异常值:")
+                    for host, channel, value in zip(outliers_before['主机'], outliers_before['通道'], outliers_before[column]):
+                        print(f"    异常值: 主机={host}, 通道={channel}, {column}={value:.2f}")
+
+                # 如果没有点被剔除，退出循环
+                if len(values) == prev_size:
+                    break
 
-            else:
-                # 如果没有设置极差阈值，保留原数据
-                filtered_df = group_df.copy()
-                if self.verbose:
-                    print(f"  未设置{column}的极差阈值，保留所有数据")
+            filtered_df = group_df.iloc[positions]
+
+            # 调试输出
+            if self.verbose:
+                print(f"  最终极差={current_range:.2f}, 迭代次数={iteration}")
 
             # 如果过滤后为空，记录该批次
             if filtered_df.empty:
@@ -1312,10 +1960,12 @@ class BatteryDataProcessor:
                 if self.verbose:
                     print(f"  批次 {batch} 的所有样品都被剔除")
             else:
-                result_df = pd.concat([result_df, filtered_df])
+                result_parts.append(filtered_df)
                 if self.verbose:
                     print(f"  批次 {batch} 保留了 {len(filtered_df)} 个样品")
 
+        result_df = pd.concat(result_parts) if result_parts else df.iloc[0:0]
+
         # 调试输出：处理结果
         if self.verbose:
             print(f"\n异常值检测结果:")
@@ -1351,192 +2001,193 @@ class BatteryDataProcessor:
         thresholds = config['thresholds']
 
         # 调试输出：显示当前使用的配置
-        print(f"当前Z-score配置: MAD常数={mad_constant}, MAD最小比例={min_mad_ratio}, 阈值={thresholds}")
+        if self.verbose:
+            print(f"当前Z-score配置: MAD常数={mad_constant}, MAD最小比例={min_mad_ratio}, 阈值={thresholds}")
 
         # 记录配置到异常检测日志
         self.logger.log_outlier_detection("Z-score+MAD异常检测开始")
-        self.logger.log_outlier_detection(f"配置参数: MAD常数={mad_constant}, MAD最小比例={min_mad_ratio}")
-        self.logger.log_outlier_detection(f"阈值设置: {thresholds}")
+        self.logger.log_outlier_detection("配置参数: MAD常数=%s, MAD最小比例=%s", mad_constant, min_mad_ratio)
+        self.logger.log_outlier_detection("阈值设置: %s", thresholds)
 
         # 记录到调试日志
         self.logger.log_debug("开始Z-score+MAD异常检测")
-        self.logger.log_debug(f"输入数据行数: {len(data)}")
-        self.logger.log_debug(f"数据列: {data.columns.tolist()}")
-        self.logger.log_debug(f"配置详情: {config}")
+        self.logger.log_debug("输入数据行数: %d", len(data))
+        self.logger.log_debug("数据列: %s", data.columns.tolist())
+        self.logger.log_debug("配置详情: %s", config)
 
         use_time_series = config['use_time_series']
         min_samples_for_stl = config['min_samples_for_stl']
 
-        # 按统一批次分组处理
-        grouped = data.groupby('统一批次')
-        result_data = pd.DataFrame()
+        # 各批次的列相同：参与检测的指标、阈值及其在指标矩阵中的列号只需确定一次
+        metrics = [metric for metric in thresholds if metric in data.columns]
+        missing_metrics = [metric for metric in thresholds if metric not in data.columns]
+        metric_items = tuple((metric, thresholds[metric], j) for j, metric in enumerate(metrics))
+        threshold_row = np.array([thresholds[metric] for metric in metrics], dtype=np.float64)
+
+        # 按统一批次分组处理（保留按批次排序的遍历顺序，合并后的批次排序不会打乱批次内样品顺序）
+        batch_indices = self._get_batch_indices(data)
+        result_parts = []  # 各批次保留的数据，循环结束后一次性合并
         completely_removed_batches = []
 
-        for batch_name, batch_data in grouped:
-            print(f"处理批次: {batch_name}, 原始数据点: {len(batch_data)}")
+        for batch_name, batch_positions in batch_indices.items():
+            batch_data = data.iloc[batch_positions]
+            if self.verbose:
+                print(f"处理批次: {batch_name}, 原始数据点: {len(batch_data)}")
 
             # 记录到异常检测日志
-            self.logger.log_outlier_detection(f"开始处理批次: {batch_name}")
-            self.logger.log_outlier_detection(f"原始数据点: {len(batch_data)}")
+            self.logger.log_outlier_detection("开始处理批次: %s", batch_name)
+            self.logger.log_outlier_detection("原始数据点: %d", len(batch_data))
 
             # 记录到调试日志
-            self.logger.log_debug(f"处理批次: {batch_name}")
-            self.logger.log_debug(f"批次数据形状: {batch_data.shape}")
-            self.logger.log_debug(f"批次数据列: {batch_data.columns.tolist()}")
+            self.logger.log_debug("处理批次: %s", batch_name)
+            self.logger.log_debug("批次数据形状: %s", batch_data.shape)
+            if self.logger.debug_enabled:
+                self.logger.log_debug("批次数据列: %s", batch_data.columns.tolist())
 
-            # 记录批次中的所有通道
-            channels_info = []
-            for idx, row in batch_data.iterrows():
-                channel_info = f"{row['主机']}-{row['通道']}"
-                channels_info.append(channel_info)
-            self.logger.log_outlier_detection(f"批次中的通道: {', '.join(channels_info)}")
+            # 记录批次中的所有通道（仅在异常检测日志启用时拼接；按行位置的标签数组，异常样本日志复用）
+            channel_labels = None
+            if self.logger.outlier_enabled:
+                channel_labels = np.array(_channel_labels(batch_data), dtype=object)
+                self.logger.log_outlier_detection("批次中的通道: %s", ', '.join(channel_labels))
 
             if len(batch_data) < 2:
-                print(f"批次 {batch_name} 数据点太少，跳过异常检测")
-                self.logger.log_outlier_detection(f"批次 {batch_name} 数据点太少，跳过异常检测")
-                result_data = pd.concat([result_data, batch_data])
+                if self.verbose:
+                    print(f"批次 {batch_name} 数据点太少，跳过异常检测")
+                self.logger.log_outlier_detection("批次 %s 数据点太少，跳过异常检测", batch_name)
+                result_parts.append(batch_data)
                 continue
 
-            current_data = batch_data.copy()
-            outliers_mask = pd.Series([False] * len(current_data), index=current_data.index)
+            current_data = batch_data  # 只读取和按掩码筛选，不修改，无需复制
+            outliers_mask = np.zeros(len(current_data), dtype=bool)  # 按行位置标记的异常点
             removed_channels = []  # 记录被剔除的通道
 
-            # 对每个指标进行异常检测
-            for metric, threshold in thresholds.items():
-                if metric not in current_data.columns:
-                    print(f"警告: 批次 {batch_name} 中缺少列 {metric}，跳过该指标")
-                    continue
+            # 所有指标一次计算中位数、MAD（含最小值限制）和修正的Z-score
+            metric_block = current_data[metrics].to_numpy(dtype=np.float64)
+            medians, mads, original_mads, z_block = _modified_zscores(metric_block, mad_constant, min_mad_ratio)
+            valid_mask = ~np.isnan(metric_block)  # 各指标的有效值掩码，整批一次计算
+            valid_counts = valid_mask.sum(axis=0)
 
-                values = current_data[metric].dropna()
-                if len(values) < 2:
-                    continue
+            # 所有指标的|Z|与阈值比较整批一次完成（NaN比较结果为False，不会被标记）
+            abs_z_block = np.abs(z_block)
+            exceed_block = abs_z_block > threshold_row
+
+            for metric in missing_metrics:
+                print(f"警告: 批次 {batch_name} 中缺少列 {metric}，跳过该指标")
 
-                # 计算中位数和MAD
-                median = values.median()
-                mad = (values - median).abs().median()
+            # 对每个指标进行异常检测
+            for metric, threshold, j in metric_items:
+                if valid_counts[j] < 2:
+                    continue
+                valid_positions = np.flatnonzero(valid_mask[:, j])
+                values = metric_block[valid_positions, j]
 
-                # 应用MAD最小值限制
-                min_mad_threshold = median * min_mad_ratio
-                original_mad = mad
-                if mad < min_mad_threshold:
-                    mad = min_mad_threshold
-                    print(f"批次 {batch_name} 指标 {metric}: 原始MAD={original_mad:.4f} 过小，调整为最小值={mad:.4f}")
+                median, mad, original_mad = medians[j], mads[j], original_mads[j]
+                if mad > original_mad:
+                    if self.verbose:
+                        print(f"批次 {batch_name} 指标 {metric}: 原始MAD={original_mad:.4f} 过小，调整为最小值={mad:.4f}")
                     # 记录MAD调整到调试日志
-                    self.logger.log_debug(f"批次 {batch_name} 指标 {metric}: MAD调整 {original_mad:.4f} -> {mad:.4f}")
+                    self.logger.log_debug("批次 %s 指标 %s: MAD调整 %.4f -> %.4f", batch_name, metric, original_mad, mad)
                 else:
                     # 记录正常MAD值到调试日志
-                    self.logger.log_debug(f"批次 {batch_name} 指标 {metric}: MAD={mad:.4f} (未调整)")
+                    self.logger.log_debug("批次 %s 指标 %s: MAD=%.4f (未调整)", batch_name, metric, mad)
 
                 if mad == 0:
-                    print(f"批次 {batch_name} 指标 {metric} 的MAD为0，跳过异常检测")
+                    if self.verbose:
+                        print(f"批次 {batch_name} 指标 {metric} 的MAD为0，跳过异常检测")
                     continue
-
-                # 计算修正的Z-score
-                modified_z_scores = mad_constant * (values - median) / mad
+                abs_z_scores = abs_z_block[valid_positions, j]
 
                 # 时间序列分解（可选）
-                if use_time_series and len(values) > min_samples_for_stl:
+                if use_time_series and _detrend is not None and len(values) > min_samples_for_stl:
                     try:
-                        from scipy import signal
                         # 简单的趋势去除
-                        detrended = signal.detrend(values.values)
+                        detrended = _detrend(values)
                         detrended_median = np.median(detrended)
                         detrended_mad = np.median(np.abs(detrended - detrended_median))
 
                         if detrended_mad > 0:
                             detrended_z_scores = mad_constant * (detrended - detrended_median) / detrended_mad
                             # 结合原始Z-score和去趋势Z-score
-                            combined_z_scores = np.maximum(np.abs(modified_z_scores), np.abs(detrended_z_scores))
+                            combined_z_scores = np.maximum(abs_z_scores, np.abs(detrended_z_scores))
                         else:
-                            combined_z_scores = np.abs(modified_z_scores)
+                            combined_z_scores = abs_z_scores
                     except Exception as e:
                         print(f"时间序列分解失败: {e}，使用标准Z-score方法")
-                        combined_z_scores = np.abs(modified_z_scores)
+                        combined_z_scores = abs_z_scores
+                    metric_outliers = combined_z_scores > threshold
                 else:
-                    combined_z_scores = np.abs(modified_z_scores)
+                    # 标准Z-score：直接取整批预先比较的结果
+                    combined_z_scores = abs_z_scores
+                    metric_outliers = exceed_block[valid_positions, j]
 
                 # 标记异常值
-                metric_outliers = combined_z_scores > threshold
-                outliers_mask.loc[values.index] |= metric_outliers
+                outliers_mask[valid_positions[metric_outliers]] = True
 
-                outlier_count = metric_outliers.sum()
+                outlier_count = int(metric_outliers.sum())
                 if outlier_count > 0:
-                    print(f"批次 {batch_name} 指标 {metric}: 检测到 {outlier_count} 个异常值 (阈值: {threshold})")
+                    if self.verbose:
+                        print(f"批次 {batch_name} 指标 {metric}: 检测到 {outlier_count} 个异常值 (阈值: {threshold})")
 
                     # 记录详细的异常信息
-                    self.logger.log_outlier_detection(f"指标 {metric} 异常检测结果:")
-                    self.logger.log_outlier_detection(f"  阈值: {threshold}")
-                    self.logger.log_outlier_detection(f"  中位数: {median:.3f}")
-                    self.logger.log_outlier_detection(f"  MAD: {mad:.3f}")
-
-                    # 记录每个异常样本的详细信息
-                    outlier_indices = values.index[metric_outliers]
-                    for i, outlier_idx in enumerate(outlier_indices):
-                        outlier_row = current_data.loc[outlier_idx]
-                        channel_id = f"{outlier_row['主机']}-{outlier_row['通道']}"
-                        outlier_value = outlier_row[metric]
-
-                        # 安全地获取Z-score值
-                        try:
-                            # 找到outlier_idx在values.index中的位置
-                            outlier_position = list(values.index).index(outlier_idx)
-                            z_score = combined_z_scores.iloc[outlier_position]
-                        except (ValueError, IndexError):
-                            # 如果找不到对应位置，直接从metric_outliers中获取
-                            outlier_positions = np.where(metric_outliers)[0]
-                            if i < len(outlier_positions):
-                                z_score = combined_z_scores.iloc[outlier_positions[i]]
+                    self.logger.log_outlier_detection("指标 %s 异常检测结果:", metric)
+                    self.logger.log_outlier_detection("  阈值: %s", threshold)
+                    self.logger.log_outlier_detection("  中位数: %.3f", median)
+                    self.logger.log_outlier_detection("  MAD: %.3f", mad)
+
+                    # 记录每个异常样本的详细信息（仅在异常检测日志启用时逐个格式化）
+                    if self.logger.outlier_enabled:
+                        outlier_positions = np.flatnonzero(metric_outliers)
+                        for channel_id, value, z_score in zip(channel_labels[valid_positions[outlier_positions]],
+                                                              values[outlier_positions],
+                                                              combined_z_scores[outlier_positions]):
+                            self.logger.log_outlier_detection("    异常样本: %s", channel_id)
+                            self.logger.log_outlier_detection("      %s值: %.3f", metric, value)
+                            if not np.isnan(z_score):
+                                self.logger.log_outlier_detection("      Z-score: %.3f", z_score)
                             else:
-                                z_score = float('nan')
-
-                        self.logger.log_outlier_detection(f"    异常样本: {channel_id}")
-                        self.logger.log_outlier_detection(f"      {metric}值: {outlier_value:.3f}")
-                        if not np.isnan(z_score):
-                            self.logger.log_outlier_detection(f"      Z-score: {z_score:.3f}")
-                        else:
-                            self.logger.log_outlier_detection(f"      Z-score: 计算错误")
+                                self.logger.log_outlier_detection("      Z-score: 计算错误")
 
-                        # 记录到被剔除通道列表（避免重复）
-                        if channel_id not in removed_channels:
-                            removed_channels.append(channel_id)
+                            # 记录到被剔除通道列表（避免重复）
+                            if channel_id not in removed_channels:
+                                removed_channels.append(channel_id)
 
             # 移除异常值
             clean_data = current_data[~outliers_mask]
             removed_count = len(current_data) - len(clean_data)
 
             if removed_count > 0:
-                print(f"批次 {batch_name} 总共去除 {removed_count} 个异常点")
+                if self.verbose:
+                    print(f"批次 {batch_name} 总共去除 {removed_count} 个异常点")
 
                 # 记录被剔除的通道汇总
-                self.logger.log_outlier_detection(f"批次 {batch_name} 异常检测汇总:")
-                self.logger.log_outlier_detection(f"  原始样本数: {len(current_data)}")
-                self.logger.log_outlier_detection(f"  剔除样本数: {removed_count}")
-                self.logger.log_outlier_detection(f"  剩余样本数: {len(clean_data)}")
+                self.logger.log_outlier_detection("批次 %s 异常检测汇总:", batch_name)
+                self.logger.log_outlier_detection("  原始样本数: %d", len(current_data))
+                self.logger.log_outlier_detection("  剔除样本数: %d", removed_count)
+                self.logger.log_outlier_detection("  剩余样本数: %d", len(clean_data))
 
-                if removed_channels:
-                    self.logger.log_outlier_detection(f"  被剔除的通道: {', '.join(set(removed_channels))}")
+                if removed_channels and self.logger.outlier_enabled:
+                    self.logger.log_outlier_detection("  被剔除的通道: %s", ', '.join(set(removed_channels)))
 
                     # 记录剩余的通道
-                    remaining_channels = []
-                    for idx, row in clean_data.iterrows():
-                        channel_id = f"{row['主机']}-{row['通道']}"
-                        remaining_channels.append(channel_id)
-                    self.logger.log_outlier_detection(f"  剩余的通道: {', '.join(remaining_channels)}")
+                    self.logger.log_outlier_detection("  剩余的通道: %s", ', '.join(_channel_labels(clean_data)))
             else:
-                print(f"批次 {batch_name} 未检测到异常点")
-                self.logger.log_outlier_detection(f"批次 {batch_name} 未检测到异常点")
+                if self.verbose:
+                    print(f"批次 {batch_name} 未检测到异常点")
+                self.logger.log_outlier_detection("批次 %s 未检测到异常点", batch_name)
 
             # 如果批次被完全剔除，记录
             if clean_data.empty:
                 completely_removed_batches.append(batch_name)
                 print(f"批次 {batch_name} 的所有样品都被剔除")
-                self.logger.log_outlier_detection(f"批次 {batch_name} 的所有样品都被剔除")
+                self.logger.log_outlier_detection("批次 %s 的所有样品都被剔除", batch_name)
             else:
-                result_data = pd.concat([result_data, clean_data])
+                result_parts.append(clean_data)
 
-            self.logger.log_outlier_detection(f"批次 {batch_name} 处理完成\n" + "="*50)
+            self.logger.log_outlier_detection("批次 %s 处理完成\n%s", batch_name, "="*50)
+            self.logger.flush()  # 每个批次的日志一次写入
 
-        # 重置索引
+        # 合并并重置索引（各批次结果只在最后合并一次）
+        result_data = pd.concat(result_parts) if result_parts else data.iloc[0:0]
         result_data = result_data.sort_values('统一批次', ascending=True)
         result_data.index = range(1, len(result_data) + 1)
 
@@ -1544,14 +2195,14 @@ class BatteryDataProcessor:
         print(f"Z-score+MAD方法完成: 总共去除 {total_removed} 个异常点")
 
         # 记录总结信息
-        self.logger.log_outlier_detection(f"\nZ-score+MAD异常检测总结:")
-        self.logger.log_outlier_detection(f"  处理批次数: {len(grouped)}")
-        self.logger.log_outlier_detection(f"  原始样本总数: {len(data)}")
-        self.logger.log_outlier_detection(f"  剔除样本总数: {total_removed}")
-        self.logger.log_outlier_detection(f"  剩余样本总数: {len(result_data)}")
-        self.logger.log_outlier_detection(f"  完全剔除的批次数: {len(completely_removed_batches)}")
+        self.logger.log_outlier_detection("\nZ-score+MAD异常检测总结:")
+        self.logger.log_outlier_detection("  处理批次数: %d", len(batch_indices))
+        self.logger.log_outlier_detection("  原始样本总数: %d", len(data))
+        self.logger.log_outlier_detection("  剔除样本总数: %d", total_removed)
+        self.logger.log_outlier_detection("  剩余样本总数: %d", len(result_data))
+        self.logger.log_outlier_detection("  完全剔除的批次数: %d", len(completely_removed_batches))
         if completely_removed_batches:
-            self.logger.log_outlier_detection(f"  完全剔除的批次: {', '.join(completely_removed_batches)}")
+            self.logger.log_outlier_detection("  完全剔除的批次: %s", ', '.join(completely_removed_batches))
 
         return result_data, completely_removed_batches
 
@@ -1576,155 +2227,52 @@ class BatteryDataProcessor:
         mad_constant = config['mad_constant']
         min_mad_ratio = config['min_mad_ratio']
         thresholds = config['thresholds']
+        max_batches = config.get('max_batches_to_plot')
 
-        # 按统一批次分组处理
-        grouped = data.groupby('统一批次')
+        # 绘图指标、阈值及列号在批次循环外确定一次（最多4个子图）
+        metrics = [metric for metric in thresholds if metric in data.columns]
+        metric_items = tuple((metric, thresholds[metric], j) for j, metric in enumerate(metrics))
 
-        for batch_name, batch_data in grouped:
-            if len(batch_data) < 2:
-                continue
+        batch_items = list(self._get_batch_indices(data).items())
+        if max_batches is not None and len(batch_items) > max_batches:
+            print(f"批次较多，仅绘制前 {max_batches} 个批次（共 {len(batch_items)} 个）")
+            batch_items = batch_items[:max_batches]
 
-            # 创建图表
-            fig, axes = plt.subplots(2, 2, figsize=(15, 12))
-            fig.suptitle(f'批次 {batch_name} 的修正Z-score分布图', fontsize=16, fontweight='bold')
-
-            axes = axes.flatten()
-            plot_idx = 0
-
-            for metric, threshold in thresholds.items():
-                if metric not in batch_data.columns or plot_idx >= 4:
-                    continue
-
-                values = batch_data[metric].dropna()
-                if len(values) < 2:
+        # 主进程按批次准备绘图数据（复用异常检测时的分组结果），渲染交给工作进程并行完成
+        tasks = []
+        for batch_name, batch_positions in batch_items:
+            if len(batch_positions) < 2:
+                continue
+            batch_data = data.iloc[batch_positions]
+
+            # 所有指标一次计算修正Z-score（与异常检测使用同一计算）
+            metric_block = batch_data[metrics].to_numpy(dtype=np.float64)
+            medians, mads, _, z_block = _modified_zscores(metric_block, mad_constant, min_mad_ratio)
+            valid_mask = ~np.isnan(metric_block)
+            valid_counts = valid_mask.sum(axis=0)
+            channel_labels = np.array(_channel_labels(batch_data), dtype=object)
+
+            panels = []
+            for metric, threshold, j in metric_items:
+                if len(panels) >= 4:
+                    break
+                if valid_counts[j] < 2:
                     continue
 
-                # 计算修正Z-score
-                median = values.median()
-                mad = (values - median).abs().median()
-
-                # 应用MAD最小值限制（与异常检测保持一致）
-                min_mad_threshold = median * min_mad_ratio
-                if mad < min_mad_threshold:
-                    mad = min_mad_threshold
-
+                median, mad = medians[j], mads[j]
                 if mad == 0:
                     continue
 
-                modified_z_scores = mad_constant * (values - median) / mad
-
-                # 绘制分布图
-                ax = axes[plot_idx]
-
-                # 绘制直方图
-                ax.hist(modified_z_scores, bins=20, alpha=0.7,
-                       color='skyblue', edgecolor='black', density=True)
-
-                # 标记阈值线
-                ax.axvline(threshold, color='red', linestyle='--', linewidth=2,
-                          label=f'正阈值: {threshold}')
-                ax.axvline(-threshold, color='red', linestyle='--', linewidth=2,
-                          label=f'负阈值: -{threshold}')
-
-                # 标记异常点
-                outliers = np.abs(modified_z_scores) > threshold
-                outlier_count = outliers.sum()
-
-                if outlier_count > 0:
-                    outlier_scores = modified_z_scores[outliers]
-                    outlier_indices = values.index[outliers]
-
-                    # 绘制异常点
-                    ax.scatter(outlier_scores, [0.02] * len(outlier_scores),
-                             color='red', s=50, marker='x',
-                             label=f'异常点: {outlier_count}个')
+                valid_positions = np.flatnonzero(valid_mask[:, j])
+                panels.append((metric, threshold, median, mad, z_block[valid_positions, j],
+                               channel_labels[valid_positions]))
 
-                    # 为异常点添加通道标签（只在异常点不太多时显示）
-                    if outlier_count <= 5:  # 避免标签过多导致图表混乱
-                        for i, (score, idx) in enumerate(zip(outlier_scores, outlier_indices)):
-                            try:
-                                outlier_row = batch_data.loc[idx]
-                                channel_label = f"{outlier_row['主机']}-{outlier_row['通道']}"
-                                ax.annotate(channel_label,
-                                          (score, 0.02),
-                                          xytext=(5, 10),
-                                          textcoords='offset points',
-                                          fontsize=8,
-                                          color='red',
-                                          ha='left')
-                            except (KeyError, IndexError):
-                                # 如果索引有问题，跳过这个标签
-                                continue
-
-                # 设置标题和标签
-                ax.set_title(f'{metric}\n(中位数: {median:.2f}, MAD: {mad:.2f})',
-                           fontsize=12, fontweight='bold')
-                ax.set_xlabel('修正Z-score', fontsize=10)
-                ax.set_ylabel('密度', fontsize=10)
-                ax.legend(fontsize=9)
-                ax.grid(True, alpha=0.3)
-
-                # 添加统计信息
-                stats_text = f'样本数: {len(values)}\n异常数: {outlier_count}\n异常率: {outlier_count/len(values)*100:.1f}%'
-
-                # 如果有异常点且数量不太多，添加异常通道列表
-                if outlier_count > 0 and outlier_count <= 3:
-                    outlier_channels = []
-                    for idx in outlier_indices:
-                        try:
-                            outlier_row = batch_data.loc[idx]
-                            channel_label = f"{outlier_row['主机']}-{outlier_row['通道']}"
-                            outlier_channels.append(channel_label)
-                        except (KeyError, IndexError):
-                            # 如果索引有问题，跳过这个通道
-                            continue
-                    if outlier_channels:  # 只有成功获取到通道信息时才显示
-                        stats_text += f'\n异常通道:\n' + '\n'.join(outlier_channels)
-                elif outlier_count > 3:
-                    stats_text += f'\n异常通道过多\n详见日志文件'
-
-                ax.text(0.02, 0.98, stats_text, transform=ax.transAxes,
-                       verticalalignment='top', fontsize=8,
-                       bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
-
-                plot_idx += 1
-
-            # 隐藏未使用的子图
-            for i in range(plot_idx, 4):
-                axes[i].set_visible(False)
-
-            # 调整布局
-            plt.tight_layout()
-
-            # 保存图片
-            safe_batch_name = "".join(c for c in batch_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            if not safe_batch_name:  # 如果清理后为空，使用默认名称
-                safe_batch_name = f"batch_{hash(batch_name) % 10000}"
-
-            filename = f"Z-score分布图_{safe_batch_name}_{timestamp}.png"
-            filepath = os.path.join(zscore_dir, filename)
-
-            # 确保文件路径长度不超过系统限制
-            if len(filepath) > 250:
-                filename = f"Z-score分布图_{timestamp}_{hash(batch_name) % 10000}.png"
-                filepath = os.path.join(zscore_dir, filename)
-
-            try:
-                # 尝试使用较低的DPI保存
-                plt.savefig(filepath, dpi=150, bbox_inches='tight', format='png')
-                print(f"已保存Z-score分布图: {filename}")
-            except Exception as e:
-                print(f"保存Z-score分布图失败: {e}")
-                # 尝试备用保存方法
-                try:
-                    backup_filename = f"Z-score分布图_backup_{timestamp}.png"
-                    backup_filepath = os.path.join(zscore_dir, backup_filename)
-                    plt.savefig(backup_filepath, dpi=100, format='png')
-                    print(f"使用备用方法保存: {backup_filename}")
-                except Exception as e2:
-                    print(f"备用保存方法也失败: {e2}")
+            tasks.append((batch_name, panels))
 
-            plt.close(fig)
+        for messages in self._iter_file_results(_render_zscore_batch, tasks,
+                                                [zscore_dir] * len(tasks), [timestamp] * len(tasks)):
+            for message in messages:
+                print(message)
 
         print(f"Z-score分布图已保存到: {zscore_dir}")
 
@@ -1750,28 +2298,41 @@ class BatteryDataProcessor:
             print("可用特征或样本不足，回退到传统方法")
             return self._select_reference_channel_from_subset(samples, use_multi_feature=False)
 
-        # 准备数据
-        X = samples[available_features].copy()
-        X = X.fillna(X.median())
-
-        # 标准化
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-
-        # 应用PCA
-        pca = PCA(n_components=CONFIG["REFERENCE_CHANNEL_CONFIG"]["pca"]["n_components"])
-        principal_components = pca.fit_transform(X_scaled)
+        # 准备数据（取出为独立的float64数组，缺失值用该列中位数原地填充）
+        X = samples[available_features].to_numpy(dtype=np.float64, copy=True)
+        missing_rows, missing_cols = np.nonzero(np.isnan(X))
+        if len(missing_rows):
+            X[missing_rows, missing_cols] = np.nanmedian(X, axis=0)[missing_cols]
+
+        # 标准化（总体标准差；方差为0的列不缩放，与StandardScaler一致）
+        std = X.std(axis=0)
+        std[std == 0] = 1.0
+        X_scaled = (X - X.mean(axis=0)) / std
+
+        pca_config = CONFIG["REFERENCE_CHANNEL_CONFIG"]["pca"]
+        n_components = pca_config["n_components"]
+        visualize = pca_config["visualization_enabled"]
+
+        if (pca_config.get("skip_pca_when_full_rank", False) and not visualize and
+                (n_components is None or n_components >= X_scaled.shape[1])):
+            # 保留全部主成分时PCA只是旋转，到中心点的距离与标准化空间中相同，无需分解
+            principal_components = None
+            distances = np.linalg.norm(X_scaled - X_scaled.mean(axis=0), axis=1)
+        else:
+            # 应用PCA
+            pca = PCA(n_components=n_components)
+            principal_components = pca.fit_transform(X_scaled)
 
-        # 计算到中心点的距离
-        center = np.mean(principal_components, axis=0)
-        distances = np.sqrt(np.sum((principal_components - center)**2, axis=1))
+            # 计算到中心点的距离
+            center = np.mean(principal_components, axis=0)
+            distances = np.sqrt(np.sum((principal_components - center)**2, axis=1))
 
         # 找到距离中心最近的样本
         most_central_idx = np.argmin(distances)
         reference_sample = samples.iloc[most_central_idx]
 
         # 可选：可视化PCA结果
-        if CONFIG["REFERENCE_CHANNEL_CONFIG"]["pca"]["visualization_enabled"]:
+        if visualize:
             # 获取批次信息用于命名
             batch_name = "未知批次"
             if '统一批次' in samples.columns and not samples['统一批次'].empty:
@@ -1892,17 +2453,18 @@ class BatteryDataProcessor:
         print("\n======开始执行参考通道选择过程======")
         print(f"数据行数: {len(data)}")
 
-        # 打印所有通道信息以便调试
-        print("\n所有候选参考通道信息:")
-        for i, (idx, row) in enumerate(data.iterrows()):
-            channel_info = f"#{i+1} 索引={idx}, 主机={row.get('主机', 'N/A')}, 通道={row.get('通道', 'N/A')}"
-            batch_info = f"批次={row.get('统一批次', 'N/A')}"
-            file_info = ""
-            if '文件名' in data.columns:
-                file_info = f", 文件名={row.get('文件名', 'N/A')}"
-            elif '文件路径' in data.columns:
-                file_info = f", 文件路径={row.get('文件路径', 'N/A')}"
-            print(f"{channel_info}, {batch_info}{file_info}")
+        # 打印所有通道信息以便调试（仅详细模式）
+        if self.verbose:
+            print("\n所有候选参考通道信息:")
+            for i, (idx, row) in enumerate(data.iterrows()):
+                channel_info = f"#{i+1} 索引={idx}, 主机={row.get('主机', 'N/A')}, 通道={row.get('通道', 'N/A')}"
+                batch_info = f"批次={row.get('统一批次', 'N/A')}"
+                file_info = ""
+                if '文件名' in data.columns:
+                    file_info = f", 文件名={row.get('文件名', 'N/A')}"
+                elif '文件路径' in data.columns:
+                    file_info = f", 文件路径={row.get('文件路径', 'N/A')}"
+                print(f"{channel_info}, {batch_info}{file_info}")
 
         # 获取配置
         config = CONFIG["REFERENCE_CHANNEL_CONFIG"]["capacity_retention"]
@@ -1916,25 +2478,33 @@ class BatteryDataProcessor:
 
         print(f"使用的容量保留率列: {available_columns}")
 
-        # 提取容量保留率数据
+        # 提取容量保留率数据：每个通道只使用其第一行
+        # （与按['主机', '通道']分组一致：跳过主机或通道缺失的行，按主机、通道排序遍历）
         retention_data = {}
-        for channel_id, channel_data in data.groupby(['主机', '通道']):
-            # 创建通道标识
-            channel_key = f"{channel_id[0]}-{channel_id[1]}"
+        channel_first_rows = data.dropna(subset=['主机', '通道'])
+        channel_first_rows = channel_first_rows[~channel_first_rows.duplicated(['主机', '通道'])]
+        channel_first_rows = channel_first_rows.sort_values(['主机', '通道'], kind='stable')
+        channel_ids = channel_first_rows['主机'].astype(str) + '-' + channel_first_rows['通道'].astype(str)
+        if '当前圈数' in channel_first_rows.columns:
+            cycle_column = channel_first_rows['当前圈数']
+        else:
+            cycle_column = pd.Series(np.nan, index=channel_first_rows.index)
+        channel_rows = pd.concat([channel_ids.rename('通道标识'), cycle_column.rename('当前圈数'),
+                                  channel_first_rows[available_columns]], axis=1)
 
+        for channel_key, cycle, *retentions in channel_rows.itertuples(index=False, name=None):
             # 提取该通道的容量保留率数据
             channel_retention = {}
-            for col in available_columns:
-                if col in channel_data.columns and pd.notna(channel_data[col].iloc[0]):
+            for col, retention in zip(available_columns, retentions):
+                if pd.notna(retention):
                     # 提取循环次数和容量保留率
-                    if col == "当前容量保持" and "当前圈数" in channel_data.columns:
-                        cycle = channel_data["当前圈数"].iloc[0]
+                    if col == "当前容量保持":
                         if pd.notna(cycle):
-                            channel_retention[int(cycle)] = channel_data[col].iloc[0]
+                            channel_retention[int(cycle)] = retention
                     elif col == "100容量保持":
-                        channel_retention[100] = channel_data[col].iloc[0]
+                        channel_retention[100] = retention
                     elif col == "200容量保持":
-                        channel_retention[200] = channel_data[col].iloc[0]
+                        channel_retention[200] = retention
 
             # 只有当有足够的数据点时才添加
             if len(channel_retention) >= 2:
@@ -1945,23 +2515,9 @@ class BatteryDataProcessor:
             print(f"没有足够的通道数据进行比较，只有{len(retention_data)}个通道有容量保留率数据")
             # 如果只有一个通道有数据，直接返回该通道
             if len(retention_data) == 1:
-                channel_key = list(retention_data.keys())[0]
+                channel_key = next(iter(retention_data))
                 print(f"只有一个通道有数据，尝试返回: {channel_key}")
-
-                # 使用统一的通道解析方法
-                host, channel = self._extract_host_and_channel(channel_key)
-
-                if host and channel:
-                    match = self._try_match_channel(host, channel, data)
-                    if match is not None:
-                        print(f"通道匹配成功! 主机={host}, 通道={channel}")
-                        return match
-
-                # 如果所有尝试都失败，回退到旧方法
-                channel_parts = channel_key.split('-')
-                match_data = data[(data['主机'] == channel_parts[0]) & (data['通道'] == '-'.join(channel_parts[1:]))]
-                if not match_data.empty:
-                    return match_data.iloc[0]
+                return self._return_first_match(channel_key, data)
             return None
 
         # 计算所有通道的循环次数范围
@@ -1990,60 +2546,54 @@ class BatteryDataProcessor:
             print(f"有效循环范围太小({max_cycle - min_cycle + 1} < {config['min_cycles']})，无法进行有效比较")
             return None
 
-        # 创建插值函数，为每个通道生成完整的容量保留率曲线
-        from scipy import interpolate
-        interpolated_curves = {}
-
         # 定义插值的循环次数范围
         interp_cycles = np.arange(min_cycle, max_cycle + 1, config["cycle_step"])
 
-        for channel_key, channel_data in retention_data.items():
-            # 只有当通道有足够的数据点时才进行插值
-            if len(channel_data) >= 2:
-                cycles = np.array(list(channel_data.keys()))
-                retentions = np.array(list(channel_data.values()))
-
-                # 创建插值函数
-                if len(cycles) >= 3 and config["interpolation_method"] == "cubic":
-                    # 至少需要3个点才能进行三次样条插值
-                    f = interpolate.interp1d(cycles, retentions, kind='cubic',
-                                            bounds_error=False, fill_value="extrapolate")
-                else:
-                    # 否则使用线性插值
-                    f = interpolate.interp1d(cycles, retentions, kind='linear',
-                                            bounds_error=False, fill_value="extrapolate")
-
-                # 生成插值曲线
-                interpolated_curve = f(interp_cycles)
-                interpolated_curves[channel_key] = interpolated_curve
+        # 为每个通道生成完整的容量保留率曲线（retention_data中的通道均至少有2个数据点），
+        # 按行写入预先分配的 通道×循环 float32矩阵，行顺序同channel_keys
+        channel_keys = list(retention_data)
+        curve_matrix = np.empty((len(channel_keys), len(interp_cycles)), dtype=np.float32)
+
+        # 至少需要3个点才能进行三次样条插值，其余通道使用线性插值
+        use_cubic = config["interpolation_method"] == "cubic"
+        linear_rows = [row for row, key in enumerate(channel_keys)
+                       if not (use_cubic and len(retention_data[key]) >= 3)]
+
+        # 线性插值：各通道节点按循环次数排序后补齐为同宽矩阵，一次计算所有通道
+        if linear_rows:
+            counts = np.array([len(retention_data[channel_keys[row]]) for row in linear_rows])
+            cycle_matrix = np.full((len(linear_rows), counts.max()), np.inf)
+            retention_matrix = np.full((len(linear_rows), counts.max()), np.nan)
+            for i, row in enumerate(linear_rows):
+                points = sorted(retention_data[channel_keys[row]].items())
+                cycle_matrix[i, :len(points)], retention_matrix[i, :len(points)] = zip(*points)
+            curve_matrix[linear_rows] = _interp_rows_linear(cycle_matrix, retention_matrix, counts,
+                                                            interp_cycles.astype(np.float64))
+
+        if len(linear_rows) < len(channel_keys):
+            # 三次样条插值才需要SciPy，线性配置下不导入
+            from scipy.interpolate import CubicSpline
+            for row in sorted(set(range(len(channel_keys))) - set(linear_rows)):
+                cycles, retentions = zip(*sorted(retention_data[channel_keys[row]].items()))
+                curve_matrix[row] = CubicSpline(cycles, retentions)(interp_cycles)
 
         # 计算平均曲线
-        if interpolated_curves:
-            all_curves = np.array(list(interpolated_curves.values()))
-            mean_curve = np.mean(all_curves, axis=0)
-
-            # 计算每个通道与平均曲线的均方误差(MSE)
-            mse_scores = {}
-            for channel_key, curve in interpolated_curves.items():
-                # 根据配置决定是否使用加权MSE
-                if config["use_weighted_mse"]:
-                    # 计算权重
-                    weights = self._calculate_cycle_weights(interp_cycles, min_cycle, max_cycle, config)
-                    # 计算加权MSE
-                    mse = np.average((curve - mean_curve) ** 2, weights=weights)
-                else:
-                    # 计算普通MSE
-                    mse = np.mean((curve - mean_curve) ** 2)
-
-                mse_scores[channel_key] = mse
+        if channel_keys:
+            # 所有通道与平均曲线的均方误差(MSE)一次计算（每行一个通道，权重所有通道共用）
+            weights = None
+            if config["use_weighted_mse"]:
+                weights = self._calculate_cycle_weights(interp_cycles, min_cycle, max_cycle, config)
+            mse_scores, mean_curve = _curve_mse(curve_matrix, weights)
 
             # 找到MSE最小的通道
-            best_channel_key = min(mse_scores, key=mse_scores.get)
-            print(f"容量保留率曲线MSE最小的通道: {best_channel_key}, MSE={mse_scores[best_channel_key]:.4f}")
+            best_index = int(np.argmin(mse_scores))
+            best_channel_key = channel_keys[best_index]
+            print(f"容量保留率曲线MSE最小的通道: {best_channel_key}, MSE={mse_scores[best_index]:.4f}")
 
             # 可视化比较结果
-            if self.verbose:
-                self._visualize_capacity_retention_curves(interp_cycles, interpolated_curves,
+            save_plots = config.get("save_plots")
+            if save_plots or (save_plots is None and self.verbose):
+                self._visualize_capacity_retention_curves(interp_cycles, dict(zip(channel_keys, curve_matrix)),
                                                         mean_curve, best_channel_key,
                                                         config["use_weighted_mse"],
                                                         weights if config["use_weighted_mse"] else None)
@@ -2129,7 +2679,7 @@ class BatteryDataProcessor:
         max_cycles = 0  # 记录最大循环次数
 
         # 遍历每个通道
-        for channel_id, channel_data in data.groupby(['主机', '通道']):
+        for channel_id, channel_data in data.groupby(['主机', '通道'], observed=True):
             channel_key = f"{channel_id[0]}-{channel_id[1]}"
 
             # 获取1C首圈编号
@@ -2154,16 +2704,10 @@ class BatteryDataProcessor:
                 channel_id = channel_data['通道'].iloc[0]
 
                 # 在文件夹中查找匹配的Excel文件 - 同时匹配主机和通道
-                excel_files = []
-                for f in os.listdir(folder_path):
-                    if f.endswith('.xlsx'):
-                        # 使用统一的主机通道解析方法
-                        file_host, file_channel = self._extract_host_and_channel(f)
-                        if file_host == device_id and file_channel == channel_id:
-                            excel_files.append(f)
-
-                if excel_files:
-                    file_path = os.path.join(folder_path, excel_files[0])
+                excel_file = self._get_folder_index(folder_path).get((device_id, channel_id))
+
+                if excel_file:
+                    file_path = os.path.join(folder_path, excel_file)
                     print(f"找到匹配的Excel文件: {file_path}")
                 else:
                     print(f"无法找到通道 {channel_key} 对应的Excel文件，跳过")
@@ -2173,8 +2717,9 @@ class BatteryDataProcessor:
             # 读取Excel文件中的循环数据
             try:
                 print(f"读取文件: {file_path}")
-                cycle_df = pd.read_excel(file_path, sheet_name=CONFIG['cycle_sheet_name'],
-                                        engine=CONFIG['excel_engine'])
+                # 只读取需要的列，与首轮处理共用解析缓存；缺少或全空的列视为不存在
+                cycle_block = _read_cycle_sheet(file_path, _RAW_CAPACITY_COLS, allow_missing=True)
+                cycle_df = pd.DataFrame(cycle_block, columns=list(_RAW_CAPACITY_COLS)).dropna(axis=1, how='all')
 
                 # 检查是否有必要的列
                 required_cols = ['循环序号', '放电比容量(mAh/g)']
@@ -2251,20 +2796,20 @@ class BatteryDataProcessor:
                 # 更新最大循环次数
                 max_cycles = max(max_cycles, cycle_data['cycle'].max())
 
-                # 存储保留率曲线
+                # 存储保留率曲线（保留率为百分数，按float32存储即可）
                 retention_curves[channel_key] = {
                     'cycles': cycle_data['cycle'].values,
-                    'capacity_retention': cycle_data['capacity_retention'].values,
+                    'capacity_retention': cycle_data['capacity_retention'].to_numpy(np.float32),
                     'one_c_cycle': one_c_cycle
                 }
 
                 # 如果有能量保留率数据，也存储
                 if 'energy_retention' in cycle_data.columns:
-                    retention_curves[channel_key]['energy_retention'] = cycle_data['energy_retention'].values
+                    retention_curves[channel_key]['energy_retention'] = cycle_data['energy_retention'].to_numpy(np.float32)
 
                 # 如果有电压保留率数据，也存储
                 if 'voltage_retention' in cycle_data.columns:
-                    retention_curves[channel_key]['voltage_retention'] = cycle_data['voltage_retention'].values
+                    retention_curves[channel_key]['voltage_retention'] = cycle_data['voltage_retention'].to_numpy(np.float32)
 
                 print(f"成功提取通道 {channel_key} 的保留率曲线，共 {len(cycle_data)} 个数据点")
 
@@ -2276,27 +2821,28 @@ class BatteryDataProcessor:
         if len(retention_curves) < 2:
             print(f"没有足够的通道数据进行比较，只有 {len(retention_curves)} 个通道有容量保留率数据")
             if len(retention_curves) == 1:
-                channel_key = list(retention_curves.keys())[0]
-                channel_parts = channel_key.split('-')
-                return data[(data['主机'] == channel_parts[0]) & (data['通道'] == channel_parts[1])].iloc[0]
+                channel_key = next(iter(retention_curves))
+                print(f"只有一个通道有数据，尝试返回: {channel_key}")
+                return self._return_first_match(channel_key, data)
             return None
 
         # 确定共同的循环范围
-        min_cycles = []
-        for channel_key, curve_data in retention_curves.items():
-            # 计算从1C首圈开始的循环数
-            cycles_after_one_c = curve_data['cycles'] - curve_data['one_c_cycle'] + 1
-            # 只考虑1C首圈及之后的循环
-            valid_cycles = cycles_after_one_c[cycles_after_one_c > 0]
-            if len(valid_cycles) > 0:
-                min_cycles.append(len(valid_cycles))
-
-        if not min_cycles:
+        for curve_data in retention_curves.values():
+            # 只考虑1C首圈及之后的循环，按循环序号升序记录其下标，插值时直接复用
+            cycles = curve_data['cycles']
+            valid_indices = np.flatnonzero(cycles >= curve_data['one_c_cycle'])
+            curve_data['valid_indices'] = valid_indices[np.argsort(cycles[valid_indices], kind='stable')]
+
+        # 各通道从1C首圈开始的循环数（不含没有数据的通道）
+        valid_counts = np.fromiter((len(curve_data['valid_indices']) for curve_data in retention_curves.values()),
+                                   dtype=np.int64, count=len(retention_curves))
+        valid_counts = valid_counts[valid_counts > 0]
+        if valid_counts.size == 0:
             print("没有通道有1C首圈之后的循环数据")
             return None
 
         # 找到所有通道从1C首圈开始的最小循环数
-        common_cycles = min(min_cycles)
+        common_cycles = int(valid_counts.min())
         print(f"所有通道从1C首圈开始的最小循环数: {common_cycles}")
 
         # 如果循环数太少，无法进行有效比较
@@ -2304,106 +2850,89 @@ class BatteryDataProcessor:
             print(f"共同循环数太少({common_cycles} < {config['min_cycles']})，无法进行有效比较")
             return None
 
-        # 创建插值函数，为每个通道生成完整的保留率曲线
-        from scipy import interpolate
-        interpolated_curves = {
-            'capacity': {},  # 容量保留率曲线
-            'energy': {},    # 能量保留率曲线
-            'voltage': {}    # 电压保留率曲线
-        }
+        # 为每个通道生成完整的保留率曲线（只有当通道有足够的数据点时才进行插值）
+        channel_keys = [key for key, curve_data in retention_curves.items() if len(curve_data['valid_indices']) >= 2]
+        if not channel_keys:
+            print("没有足够的容量保留率数据进行比较")
+            return None
+        if len(channel_keys) == 1:
+            # 只有一个通道可插值时无需与平均曲线比较，直接返回该通道
+            print(f"只有一个通道有足够的保留率数据，直接返回: {channel_keys[0]}")
+            return self._return_first_match(channel_keys[0], data)
+
+        # 各指标的曲线按 通道×循环位置 存入同一float32矩阵，行顺序同channel_keys；
+        # has_metric标记各通道是否有该指标（能量、电压仅在有数据且启用时插值）
+        curve_matrices = {metric: np.full((len(channel_keys), common_cycles), np.nan, dtype=np.float32)
+                          for metric in ('capacity', 'energy', 'voltage')}
+        has_metric = {metric: np.zeros(len(channel_keys), dtype=bool) for metric in curve_matrices}
+        retention_keys = {'capacity': 'capacity_retention', 'energy': 'energy_retention', 'voltage': 'voltage_retention'}
+        use_cubic = config["interpolation_method"] == "cubic"
 
         # 定义插值的循环位置范围（从0到common_cycles-1）
         cycle_positions = np.arange(common_cycles)
-
-        for channel_key, curve_data in retention_curves.items():
-            # 计算从1C首圈开始的循环位置
-            one_c_cycle = curve_data['one_c_cycle']
-            cycles = curve_data['cycles']
-
-            # 处理容量保留率
-            capacity_retention = curve_data['capacity_retention']
-
-            # 只考虑1C首圈及之后的循环
-            valid_indices = cycles >= one_c_cycle
-            valid_cycles = cycles[valid_indices]
-            valid_capacity_retention = capacity_retention[valid_indices]
-
-            # 计算循环位置（从0开始）
-            cycle_positions_actual = valid_cycles - one_c_cycle
-
-            # 只有当通道有足够的数据点时才进行插值
-            if len(cycle_positions_actual) >= 2:
-                # 创建容量保留率插值函数
-                if len(cycle_positions_actual) >= 3 and config["interpolation_method"] == "cubic":
-                    # 至少需要3个点才能进行三次样条插值
-                    f_capacity = interpolate.interp1d(cycle_positions_actual, valid_capacity_retention, kind='cubic',
-                                                    bounds_error=False, fill_value="extrapolate")
-                else:
-                    # 否则使用线性插值
-                    f_capacity = interpolate.interp1d(cycle_positions_actual, valid_capacity_retention, kind='linear',
-                                                    bounds_error=False, fill_value="extrapolate")
-
-                # 生成容量保留率插值曲线
-                interpolated_capacity = f_capacity(cycle_positions)
-                interpolated_curves['capacity'][channel_key] = interpolated_capacity
-
-                # 处理能量保留率（如果有）
-                if 'energy_retention' in curve_data and config.get("include_energy", False):
-                    energy_retention = curve_data['energy_retention']
-                    valid_energy_retention = energy_retention[valid_indices]
-
-                    # 创建能量保留率插值函数
-                    if len(cycle_positions_actual) >= 3 and config["interpolation_method"] == "cubic":
-                        f_energy = interpolate.interp1d(cycle_positions_actual, valid_energy_retention, kind='cubic',
-                                                      bounds_error=False, fill_value="extrapolate")
-                    else:
-                        f_energy = interpolate.interp1d(cycle_positions_actual, valid_energy_retention, kind='linear',
-                                                      bounds_error=False, fill_value="extrapolate")
-
-                    # 生成能量保留率插值曲线
-                    interpolated_energy = f_energy(cycle_positions)
-                    interpolated_curves['energy'][channel_key] = interpolated_energy
-
-                # 处理电压保留率（如果有）
-                if 'voltage_retention' in curve_data and config.get("include_voltage", False):
-                    voltage_retention = curve_data['voltage_retention']
-                    valid_voltage_retention = voltage_retention[valid_indices]
-
-                    # 创建电压保留率插值函数
-                    if len(cycle_positions_actual) >= 3 and config["interpolation_method"] == "cubic":
-                        f_voltage = interpolate.interp1d(cycle_positions_actual, valid_voltage_retention, kind='cubic',
-                                                       bounds_error=False, fill_value="extrapolate")
-                    else:
-                        f_voltage = interpolate.interp1d(cycle_positions_actual, valid_voltage_retention, kind='linear',
-                                                       bounds_error=False, fill_value="extrapolate")
-
-                    # 生成电压保留率插值曲线
-                    interpolated_voltage = f_voltage(cycle_positions)
-                    interpolated_curves['voltage'][channel_key] = interpolated_voltage
+        linear_nodes = []  # 待线性插值通道的插值节点（同一通道的各指标共用）
+        linear_rows = []   # 待线性插值的(指标, 通道行号, 节点行号, 节点取值)
+
+        for row, channel_key in enumerate(channel_keys):
+            # 计算从1C首圈开始的循环位置（从0开始）
+            curve_data = retention_curves[channel_key]
+            valid_indices = curve_data['valid_indices']
+            cycle_positions_actual = curve_data['cycles'][valid_indices] - curve_data['one_c_cycle']
+
+            # 需要插值的指标：容量保留率，以及有数据且启用的能量、电压保留率
+            metrics = ['capacity'] + [metric for metric in ('energy', 'voltage')
+                                      if retention_keys[metric] in curve_data and config.get(f"include_{metric}", False)]
+            for metric in metrics:
+                has_metric[metric][row] = True
+
+            if len(cycle_positions_actual) >= 3 and use_cubic:
+                # 至少需要3个点才能进行三次样条插值，各指标共用一个样条（按列插值）；线性配置下不导入SciPy
+                from scipy.interpolate import CubicSpline
+                spline = CubicSpline(cycle_positions_actual,
+                                     np.column_stack([curve_data[retention_keys[metric]][valid_indices]
+                                                      for metric in metrics]), axis=0)
+                curves = spline(cycle_positions)
+                for k, metric in enumerate(metrics):
+                    curve_matrices[metric][row] = curves[:, k]
+            else:
+                # 否则使用线性插值，循环结束后统一计算
+                linear_nodes.append(cycle_positions_actual)
+                for metric in metrics:
+                    linear_rows.append((metric, row, len(linear_nodes) - 1,
+                                        curve_data[retention_keys[metric]][valid_indices]))
+
+        # 线性插值：各通道节点、各指标取值分别补齐为同宽矩阵，一次计算所有曲线（每个通道只查找一次区间）
+        if linear_rows:
+            counts = np.array([len(positions) for positions in linear_nodes])
+            cycle_matrix = np.full((len(linear_nodes), counts.max()), np.inf, dtype=np.float32)
+            for i, positions in enumerate(linear_nodes):
+                cycle_matrix[i, :len(positions)] = positions
+            retention_matrix = np.full((len(linear_rows), counts.max()), np.nan, dtype=np.float32)
+            for i, (_, _, _, values) in enumerate(linear_rows):
+                retention_matrix[i, :len(values)] = values
+            node_rows = np.array([item[2] for item in linear_rows])
+            curves = _interp_rows_linear(cycle_matrix, retention_matrix, counts, cycle_positions.astype(np.float32),
+                                         node_rows)
+            for (metric, row, _, _), curve in zip(linear_rows, curves):
+                curve_matrices[metric][row] = curve
 
         # 计算平均曲线和MSE
         mean_curves = {}
-        mse_scores = {}
-        combined_mse_scores = {}
 
-        # 检查是否有足够的数据进行比较
-        if not interpolated_curves['capacity']:
-            print("没有足够的容量保留率数据进行比较")
-            return None
-
-        # 计算容量保留率平均曲线
-        capacity_curves = np.array(list(interpolated_curves['capacity'].values()))
-        mean_curves['capacity'] = np.mean(capacity_curves, axis=0)
-
-        # 计算能量保留率平均曲线（如果有）
-        if interpolated_curves['energy'] and config.get("include_energy", False):
-            energy_curves = np.array(list(interpolated_curves['energy'].values()))
-            mean_curves['energy'] = np.mean(energy_curves, axis=0)
+        # 权重所有通道、所有指标共用，只计算一次
+        weights = None
+        if config["use_weighted_mse"]:
+            weights = self._calculate_cycle_weights(cycle_positions, 0, common_cycles-1, config)
 
-        # 计算电压保留率平均曲线（如果有）
-        if interpolated_curves['voltage'] and config.get("include_voltage", False):
-            voltage_curves = np.array(list(interpolated_curves['voltage'].values()))
-            mean_curves['voltage'] = np.mean(voltage_curves, axis=0)
+        # 各指标所有通道的平均曲线和MSE按矩阵一次计算，无该指标的通道MSE记为NaN
+        metric_mse = {}
+        for metric, rows in has_metric.items():
+            if not rows.any():
+                continue
+            matrix = curve_matrices[metric] if rows.all() else curve_matrices[metric][rows]
+            scores, mean_curves[metric] = _curve_mse(matrix, weights)
+            metric_mse[metric] = np.full(len(channel_keys), np.nan, dtype=np.float32)
+            metric_mse[metric][rows] = scores
 
         # 获取权重配置
         capacity_weight = config.get("capacity_weight", 0.6)
@@ -2412,9 +2941,9 @@ class BatteryDataProcessor:
 
         # 确保权重和为1
         total_weight = capacity_weight
-        if interpolated_curves['energy'] and config.get("include_energy", False):
+        if 'energy' in metric_mse:
             total_weight += energy_weight
-        if interpolated_curves['voltage'] and config.get("include_voltage", False):
+        if 'voltage' in metric_mse:
             total_weight += voltage_weight
 
         if total_weight != 1.0:
@@ -2422,68 +2951,33 @@ class BatteryDataProcessor:
             energy_weight /= total_weight
             voltage_weight /= total_weight
 
-        # 计算每个通道的MSE
-        for channel_key in interpolated_curves['capacity'].keys():
-            # 计算容量保留率MSE
-            capacity_curve = interpolated_curves['capacity'][channel_key]
-
-            # 根据配置决定是否使用加权MSE
-            if config["use_weighted_mse"]:
-                # 计算权重
-                weights = self._calculate_cycle_weights(cycle_positions, 0, common_cycles-1, config)
-                # 计算加权MSE
-                capacity_mse = np.average((capacity_curve - mean_curves['capacity']) ** 2, weights=weights)
-            else:
-                # 计算普通MSE
-                capacity_mse = np.mean((capacity_curve - mean_curves['capacity']) ** 2)
-
-            # 存储容量保留率MSE
-            mse_scores[channel_key] = {'capacity': capacity_mse}
-
-            # 初始化综合MSE
-            combined_mse = capacity_weight * capacity_mse
-
-            # 计算能量保留率MSE（如果有）
-            if channel_key in interpolated_curves['energy'] and config.get("include_energy", False):
-                energy_curve = interpolated_curves['energy'][channel_key]
-
-                if config["use_weighted_mse"]:
-                    energy_mse = np.average((energy_curve - mean_curves['energy']) ** 2, weights=weights)
-                else:
-                    energy_mse = np.mean((energy_curve - mean_curves['energy']) ** 2)
-
-                mse_scores[channel_key]['energy'] = energy_mse
-                combined_mse += energy_weight * energy_mse
+        # 所有通道的综合MSE按数组一次计算，无该指标的通道不计入对应项
+        combined_mse = capacity_weight * metric_mse['capacity']
+        if 'energy' in metric_mse:
+            combined_mse += np.where(has_metric['energy'], energy_weight * metric_mse['energy'], 0)
+        if 'voltage' in metric_mse:
+            combined_mse += np.where(has_metric['voltage'], voltage_weight * metric_mse['voltage'], 0)
 
-            # 计算电压保留率MSE（如果有）
-            if channel_key in interpolated_curves['voltage'] and config.get("include_voltage", False):
-                voltage_curve = interpolated_curves['voltage'][channel_key]
-
-                if config["use_weighted_mse"]:
-                    voltage_mse = np.average((voltage_curve - mean_curves['voltage']) ** 2, weights=weights)
-                else:
-                    voltage_mse = np.mean((voltage_curve - mean_curves['voltage']) ** 2)
-
-                mse_scores[channel_key]['voltage'] = voltage_mse
-                combined_mse += voltage_weight * voltage_mse
-
-            # 存储综合MSE
-            combined_mse_scores[channel_key] = combined_mse
-
-        # 找到综合MSE最小的通道
-        if combined_mse_scores:
-            best_channel_key = min(combined_mse_scores, key=combined_mse_scores.get)
-            print(f"保留率曲线综合MSE最小的通道: {best_channel_key}, MSE={combined_mse_scores[best_channel_key]:.4f}")
+        # 找到综合MSE最小的通道（综合MSE为NaN的通道视为最差）
+        if channel_keys:
+            best_row = int(np.argmin(np.nan_to_num(combined_mse, nan=np.inf)))
+            best_channel_key = channel_keys[best_row]
+            print(f"保留率曲线综合MSE最小的通道: {best_channel_key}, MSE={combined_mse[best_row]:.4f}")
 
             # 输出各指标的MSE
-            print(f"  容量保留率MSE: {mse_scores[best_channel_key]['capacity']:.4f}")
-            if 'energy' in mse_scores[best_channel_key]:
-                print(f"  能量保留率MSE: {mse_scores[best_channel_key]['energy']:.4f}")
-            if 'voltage' in mse_scores[best_channel_key]:
-                print(f"  电压保留率MSE: {mse_scores[best_channel_key]['voltage']:.4f}")
+            print(f"  容量保留率MSE: {metric_mse['capacity'][best_row]:.4f}")
+            if has_metric['energy'][best_row]:
+                print(f"  能量保留率MSE: {metric_mse['energy'][best_row]:.4f}")
+            if has_metric['voltage'][best_row]:
+                print(f"  电压保留率MSE: {metric_mse['voltage'][best_row]:.4f}")
 
             # 可视化比较结果
-            if self.verbose:
+            save_plots = config.get("save_plots")
+            if save_plots or (save_plots is None and self.verbose):
+                interpolated_curves = {
+                    metric: {channel_keys[row]: curve_matrices[metric][row] for row in np.flatnonzero(rows)}
+                    for metric, rows in has_metric.items()
+                }
                 self._visualize_retention_curves(cycle_positions, interpolated_curves, mean_curves,
                                                best_channel_key, config)
 
@@ -2495,51 +2989,49 @@ class BatteryDataProcessor:
                 host, channel = self._extract_host_and_channel(best_channel_key)
                 print(f"通道标识拆分为: 主机={host}, 通道={channel}")
 
-                # 打印所有主机和通道信息，便于调试
-                print("\n数据中的所有主机-通道对:")
-                for i, (idx, row) in enumerate(data.iterrows()):
-                    if '主机' in row and '通道' in row:
-                        print(f"  #{i+1} 索引={idx}, 主机='{row['主机']}', 通道='{row['通道']}'")
-
                 # 尝试精确匹配
                 best_channel_data = data[(data['主机'] == host) & (data['通道'] == channel)]
 
                 # 如果精确匹配未找到结果，记录警告并尝试模糊匹配
                 if best_channel_data.empty:
                     print(f"警告: 无法在数据中找到精确匹配的通道: 主机='{host}', 通道='{channel}'")
-                    print(f"数据中的主机列唯一值: {data['主机'].unique()}")
-                    print(f"数据中的通道列唯一值: {data['通道'].unique()}")
+                    # 主机、通道唯一值只取一次，诊断输出和模糊匹配共用
+                    hosts_unique = data['主机'].unique()
+                    channels_unique = data['通道'].unique()
+                    print(f"数据中的主机列唯一值: {hosts_unique}")
+                    print(f"数据中的通道列唯一值: {channels_unique}")
 
-                    # 打印格式信息，帮助检测隐藏字符或格式问题
-                    print("\n格式比较:")
-                    print(f"要匹配的主机: '{host}', 长度={len(host)}, ASCII码=[{','.join([str(ord(c)) for c in host])}]")
-                    for h in data['主机'].unique():
-                        print(f"数据中的主机: '{h}', 长度={len(h)}, ASCII码=[{','.join([str(ord(c)) for c in str(h)])}]")
+                    # 打印格式信息，帮助检测隐藏字符或格式问题（仅详细模式）
+                    if self.verbose:
+                        print("\n格式比较:")
+                        # 只列出前2个与目标不同的主机/通道值，足以对比出格式差异
+                        print(f"要匹配的主机: '{host}', 长度={len(host)}, ASCII码=[{_ascii_dump(host)}]")
+                        for h in [h for h in hosts_unique if h != host][:2]:
+                            print(f"数据中的主机: '{h}', 长度={len(h)}, ASCII码=[{_ascii_dump(h)}]")
 
-                    print(f"要匹配的通道: '{channel}', 长度={len(channel)}, ASCII码=[{','.join([str(ord(c)) for c in channel])}]")
-                    for c in data['通道'].unique():
-                        print(f"数据中的通道: '{c}', 长度={len(c)}, ASCII码=[{','.join([str(ord(c)) for c in str(c)])}]")
+                        print(f"要匹配的通道: '{channel}', 长度={len(channel)}, ASCII码=[{_ascii_dump(channel)}]")
+                        for c in [c for c in channels_unique if c != channel][:2]:
+                            print(f"数据中的通道: '{c}', 长度={len(c)}, ASCII码=[{_ascii_dump(c)}]")
 
                     # 尝试模糊匹配
                     print("\n尝试模糊匹配 - 清理格式后比较:")
                     clean_host = str(host).strip()
                     clean_channel = str(channel).strip()
 
-                    for idx, row in data.iterrows():
-                        if '主机' in row and '通道' in row:
-                            data_host = str(row['主机']).strip()
-                            data_channel = str(row['通道']).strip()
+                    # 只对唯一值清理格式，再按原值筛选行
+                    fuzzy_hosts = [h for h in hosts_unique if str(h).strip() == clean_host]
+                    fuzzy_channels = [c for c in channels_unique if str(c).strip() == clean_channel]
+                    fuzzy_match = data[data['主机'].isin(fuzzy_hosts) & data['通道'].isin(fuzzy_channels)]
+                    if not fuzzy_match.empty:
+                        print(f"找到模糊匹配! 索引={fuzzy_match.index[0]}")
+                        return fuzzy_match.iloc[0]
 
-                            if data_host == clean_host and data_channel == clean_channel:
-                                print(f"找到模糊匹配! 索引={idx}")
-                                return row
-
-                    # 打印所有文件信息，帮助调试
-                    if '文件名' in data.columns:
+                    # 打印所有文件信息，帮助调试（仅详细模式）
+                    if self.verbose and '文件名' in data.columns:
                         print("\n所有文件名:")
                         for i, fname in enumerate(data['文件名'].unique()):
                             print(f"  {i+1}. {fname}")
-                    if '文件路径' in data.columns:
+                    if self.verbose and '文件路径' in data.columns:
                         print("\n所有文件路径:")
                         for i, fpath in enumerate(data['文件路径'].unique()):
                             print(f"  {i+1}. {fpath}")
@@ -2638,8 +3130,34 @@ class BatteryDataProcessor:
             print(f"批次提取异常: {str(e)}")
             return filename.split('.')[0]  # 备用方案
 
-    def _extract_host_and_channel(self, channel_key):
-        """从通道标识中提取主机和通道信息
+    def _get_folder_index(self, folder_path):
+        """返回文件夹中Excel文件按(主机, 通道)建立的索引，同一文件夹只扫描一次
+
+        Args:
+            folder_path: 数据文件夹路径
+
+        Returns:
+            dict: (主机, 通道) -> 文件名（同一通道有多个文件时取目录中的第一个）
+        """
+        if self._folder_index is not None and self._folder_index[0] == folder_path:
+            return self._folder_index[1]
+
+        # 所有文件名一次解析出主机和通道，无法解析的文件名整体作为主机（与_extract_host_and_channel一致）
+        files = pd.Series([f for f in os.listdir(folder_path) if f.endswith('.xlsx')], dtype=object)
+        parts = files.str.extract(_HOST_CHANNEL_RE)
+        hosts = parts['ip_host'].fillna(parts['host']).fillna(files)
+        channels = parts['ip_channel'].fillna(parts['channel']).fillna('')
+
+        index = {}
+        for host, channel, f in zip(hosts, channels, files):
+            index.setdefault((host, channel), f)
+        self._folder_index = (folder_path, index)
+        return index
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _extract_host_and_channel(channel_key):
+        """从通道标识中提取主机和通道信息（纯字符串解析，结果带缓存）
 
         使用最简单的字符检测方法：
         - 如果第一段包含"." → IP格式 → 前2段是主机，第3-4段是通道
@@ -2690,35 +3208,29 @@ class BatteryDataProcessor:
         if config is None:
             config = CONFIG["REFERENCE_CHANNEL_CONFIG"]["capacity_retention"]
 
-        n_cycles = len(cycles)
-        weight_method = config["weight_method"]
-        weight_factor = config["weight_factor"]
-        late_emphasis = config["late_cycles_emphasis"]
-
-        if weight_method == "constant":
-            # 恒定权重
-            weights = np.ones(n_cycles)
-        elif weight_method == "linear":
-            # 线性增长权重: w_j = 1 + weight_factor * j/(n-1)
-            weights = 1 + weight_factor * np.linspace(0, 1, n_cycles)
-        elif weight_method == "exp":
-            # 指数增长权重: w_j = exp(weight_factor * j/(n-1))
-            weights = np.exp(weight_factor * np.linspace(0, 1, n_cycles))
-        else:
-            # 默认使用线性权重
-            weights = 1 + weight_factor * np.linspace(0, 1, n_cycles)
+        # 权重只取决于循环数和权重配置，相同组合直接复用缓存结果
+        return _cycle_weights(len(cycles), config["weight_method"], config["weight_factor"],
+                              config["late_cycles_emphasis"])
 
-        # 对后期循环额外加权
-        if late_emphasis > 1.0 and n_cycles > 10:
-            # 确定后期循环的起始位置（最后30%的循环）
-            late_start = int(n_cycles * 0.7)
-            # 对后期循环应用额外权重
-            weights[late_start:] *= late_emphasis
+    def _get_retention_figure(self, figsize):
+        """获取保留率曲线比较图的Figure：尺寸相同时清空上一次的图复用，否则新建
 
-        # 归一化权重，使其和为n_cycles
-        weights = weights * n_cycles / np.sum(weights)
+        Args:
+            figsize: 图表尺寸(宽, 高)
 
-        return weights
+        Returns:
+            已清空的Figure对象（constrained布局）
+        """
+        fig = getattr(self, '_retention_fig', None)
+        if fig is not None and tuple(fig.get_size_inches()) == tuple(figsize):
+            fig.clear()
+            return fig
+
+        # 直接创建Figure（不经过pyplot状态机），由实例持有以便复用
+        fig = Figure(figsize=figsize, layout='constrained')
+        FigureCanvasAgg(fig)
+        self._retention_fig = fig
+        return fig
 
     def _visualize_retention_curves(self, cycles, curves, mean_curves, best_channel_key, config):
         """可视化保留率曲线比较结果
@@ -2742,8 +3254,8 @@ class BatteryDataProcessor:
         n_rows = n_metrics + 1  # 额外一行用于权重或偏差
 
         # 创建图表
-        fig, axes = plt.subplots(n_rows, 1, figsize=(12, 5 * n_rows),
-                                gridspec_kw={'height_ratios': [3] * n_metrics + [1]})
+        fig = self._get_retention_figure((12, 5 * n_rows))
+        axes = fig.subplots(n_rows, 1, gridspec_kw={'height_ratios': [3] * n_metrics + [1]})
 
         # 如果只有一个指标，确保axes是列表
         if n_metrics == 1:
@@ -2816,18 +3328,12 @@ class BatteryDataProcessor:
             ax_last.grid(True, linestyle='--', alpha=0.5)
             ax_last.legend()
 
-        # 调整子图之间的间距
-        plt.tight_layout()
-
-        # 保存图表
+        # 保存图表（子图间距由constrained布局处理）
         save_dir = self.folder_path
         save_path = os.path.join(save_dir, "retention_curves_comparison.png")
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
+        fig.savefig(save_path, dpi=config.get("plot_dpi", 100))
         print(f"已保存保留率曲线比较图表: {save_path}")
 
-        # 不显示图表，直接关闭
-        plt.close()
-
     def _visualize_capacity_retention_curves(self, cycles, curves, mean_curve, best_channel_key,
                                       weighted=False, weights=None):
         """可视化容量保留率曲线比较结果（兼容旧版本）
@@ -2841,7 +3347,8 @@ class BatteryDataProcessor:
             weights: 权重数组
         """
         # 创建一个包含两个子图的图表
-        _, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10), gridspec_kw={'height_ratios': [3, 1]})
+        fig = self._get_retention_figure((12, 10))
+        ax1, ax2 = fig.subplots(2, 1, gridspec_kw={'height_ratios': [3, 1]})
 
         # 在第一个子图中绘制容量保留率曲线
         for channel_key, curve in curves.items():
@@ -2881,18 +3388,12 @@ class BatteryDataProcessor:
             ax2.grid(True, linestyle='--', alpha=0.5)
             ax2.legend()
 
-        # 调整子图之间的间距
-        plt.tight_layout()
-
-        # 保存图表
+        # 保存图表（子图间距由constrained布局处理）
         save_dir = self.folder_path
         save_path = os.path.join(save_dir, "capacity_retention_comparison.png")
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
+        fig.savefig(save_path, dpi=CONFIG["REFERENCE_CHANNEL_CONFIG"]["capacity_retention"].get("plot_dpi", 100))
         print(f"已保存容量保留率曲线比较图表: {save_path}")
 
-        # 不显示图表，直接关闭
-        plt.close()
-
     def _visualize_pca_result(self, pca_results, central_idx, sample_ids, batch_name=None, save_path=None):
         """可视化PCA结果
 
@@ -2937,7 +3438,7 @@ class BatteryDataProcessor:
             # 保存图片数据和文件名
             import io
             buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=300, bbox_inches='tight')
+            self._savefig(buf, format='png')
             buf.seek(0)
 
             self._pca_plots.append({
@@ -2949,7 +3450,7 @@ class BatteryDataProcessor:
             print(f"PCA分析图表已准备保存: {filename}")
         else:
             # 如果指定了保存路径，直接保存
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            self._savefig(save_path)
             print(f"已保存PCA分析图表: {save_path}")
 
         # 不显示图形，只关闭
@@ -2957,7 +3458,7 @@ class BatteryDataProcessor:
 
     def _multi_feature_reference_selection(self, data, features=['首放', '首效', '首圈电压']):
         """
-        使用多特征PCA降维选择参考通道
+        使用多特征标准化距离选择参考通道（各特征按列标准化后，取离均值最近的样本）
 
         Parameters:
         -----------
@@ -2986,36 +3487,21 @@ class BatteryDataProcessor:
                 print("无可用特征进行多特征参考通道选择")
                 return data.iloc[0]
 
-        # 确保没有缺失值
-        valid_data = data[available_features].dropna()
-        if len(valid_data) < 2:
+        # 确保没有缺失值（按位置记录特征完整的行）
+        values = data[available_features].to_numpy(dtype=np.float64)
+        complete_pos = np.flatnonzero(~np.isnan(values).any(axis=1))
+        if len(complete_pos) < 2:
             # 数据不足，回退到原方法
-            print("有效数据不足进行PCA，回退到传统方法")
+            print("有效数据不足进行多特征选择，回退到传统方法")
             return data.iloc[0]
 
         try:
-            # 数据规范化
-            normalized_data = (valid_data - valid_data.mean()) / valid_data.std()
-
-            # PCA降维
-            n_components = min(len(available_features), 2)  # 取最多2个主成分
-            pca = PCA(n_components=n_components)
-            X_pca = pca.fit_transform(normalized_data)
-
-            # 计算中心点
-            centroid = np.mean(X_pca, axis=0)
-
-            # 计算距离
-            distances = [np.linalg.norm(x - centroid) for x in X_pca]
-            ref_idx = np.argmin(distances)
-
-            # 获取原始索引
-            original_idx = valid_data.index[ref_idx]
-            ref_row = data.loc[original_idx]
-            print(f"多特征选择参考通道: 基于{available_features}的PCA分析")
-            return ref_row
+            # 在特征完整的行中选择标准化后离均值最近的行
+            best_pos = complete_pos[_nearest_standardized_row(values[complete_pos])]
+            print(f"多特征选择参考通道: 基于{available_features}的标准化距离")
+            return data.iloc[best_pos]
         except Exception as e:
-            print(f"PCA分析异常: {str(e)}，回退到传统方法")
+            print(f"多特征距离计算异常: {str(e)}，回退到传统方法")
             # 出错时回退到原始方法
             if '首放' in data.columns:
                 subset_discharge_mean = data['首放'].mean()
@@ -3034,6 +3520,7 @@ class BatteryDataProcessor:
         save_dir: str, optional
             图表保存目录，默认为当前目录
         """
+        self._ensure_dataframes()
         if self.all_cycle_data.empty:
             print("无数据可供可视化")
             return
@@ -3070,7 +3557,7 @@ class BatteryDataProcessor:
 
                 # 保存图片
                 save_path = os.path.join(save_dir, 'discharge_capacity_distribution.png')
-                plt.savefig(save_path, dpi=300, bbox_inches='tight')
+                self._savefig(save_path)
                 print(f"已保存图表: {save_path}")
 
                 # 不显示图形，直接关闭
@@ -3088,7 +3575,7 @@ class BatteryDataProcessor:
                     sns.boxplot(x='1C状态', y='首效', data=valid_data)
                 else:
                     # 使用matplotlib绘制简单箱线图
-                    groups = valid_data.groupby('1C状态')['首效']
+                    groups = valid_data.groupby('1C状态', observed=True)['首效']
                     positions = range(len(groups))
                     data = [group for _, group in groups]
                     plt.boxplot(data, positions=positions)
@@ -3100,7 +3587,7 @@ class BatteryDataProcessor:
 
                 # 保存图片
                 save_path = os.path.join(save_dir, 'boxplot_首效_by_1C状态.png')
-                plt.savefig(save_path, dpi=300, bbox_inches='tight')
+                self._savefig(save_path)
                 print(f"已保存图表: {save_path}")
 
                 # 不显示图形，直接关闭
@@ -3117,16 +3604,20 @@ class BatteryDataProcessor:
                 X = self.all_cycle_data[available_features].dropna()
 
                 if len(X) > 5:  # 确保有足够数据点
-                    # 数据规范化
-                    X_norm = (X - X.mean()) / X.std()
+                    # 数据规范化（按列均值、样本标准差直接在NumPy数组上计算）
+                    X_values = X.to_numpy(dtype=np.float64)
+                    X_norm = (X_values - X_values.mean(axis=0)) / X_values.std(axis=0, ddof=1)
 
-                    # PCA降维
-                    pca = PCA(n_components=2)
-                    X_pca = pca.fit_transform(X_norm)
+                    # PCA降维：标准化数据已中心化，直接做SVD取前两个主成分
+                    U, S, Vt = np.linalg.svd(X_norm, full_matrices=False)
+                    # 与sklearn一致的符号约定：每个主成分载荷中绝对值最大的分量取正
+                    signs = np.sign(Vt[np.arange(len(Vt)), np.abs(Vt).argmax(axis=1)])
+                    X_pca = U[:, :2] * (S[:2] * signs[:2])
+                    explained_variance_ratio = S ** 2 / np.sum(S ** 2)
 
                     # 添加1C状态
                     if '1C状态' in self.all_cycle_data.columns:
-                        status = self.all_cycle_data.loc[X.index, '1C状态'].fillna('未知')
+                        status = self.all_cycle_data.loc[X.index, '1C状态'].astype(object).fillna('未知')
                     else:
                         status = pd.Series(['数据'] * len(X), index=X.index)
 
@@ -3146,14 +3637,14 @@ class BatteryDataProcessor:
                             plt.scatter(group['PC1'], group['PC2'], label=status_name, alpha=0.7)
 
                     plt.title('电池参数PCA降维可视化')
-                    plt.xlabel(f'主成分1 ({pca.explained_variance_ratio_[0]:.2%}方差)')
-                    plt.ylabel(f'主成分2 ({pca.explained_variance_ratio_[1]:.2%}方差)')
+                    plt.xlabel(f'主成分1 ({explained_variance_ratio[0]:.2%}方差)')
+                    plt.ylabel(f'主成分2 ({explained_variance_ratio[1]:.2%}方差)')
                     plt.grid(True, linestyle='--', alpha=0.7)
                     plt.legend()
 
                     # 保存图片
                     save_path = os.path.join(save_dir, 'pca_visualization.png')
-                    plt.savefig(save_path, dpi=300, bbox_inches='tight')
+                    self._savefig(save_path)
                     print(f"已保存图表: {save_path}")
 
                     # 不显示图形，直接关闭
@@ -3166,13 +3657,13 @@ class BatteryDataProcessor:
             # 检查是否有1C数据
             if '1C首圈编号' in self.all_cycle_data.columns and '模式' in self.all_cycle_data.columns:
                 # 检查是否有1C模式数据
-                has_1c_data = any(mode in CONFIG["MODE_CONFIG"]["one_c_modes"] for mode in self.all_cycle_data['模式'].unique())
+                has_1c_data = not _ONE_C_MODES.isdisjoint(self.all_cycle_data['模式'].unique())
                 if has_1c_data:
                     # 绘制并保存1C首圈分布图
                     fig = self.plot_1c_distribution()
                     if fig is not None:  # 确认有图可保存
                         save_path = os.path.join(save_dir, '1c_first_cycle_distribution.png')
-                        plt.savefig(save_path, dpi=300, bbox_inches='tight')
+                        self._savefig(save_path)
                         print(f"已保存图表: {save_path}")
 
                         # 不显示图形，直接关闭
@@ -3186,42 +3677,60 @@ class BatteryDataProcessor:
 
         print("所有可视化图表已生成完毕")
 
-    def _calculate_basic_statistics(self, series, batch, group):
-        """计算基本统计值 - 使用所有有效样品计算均值"""
-        # 获取该批次在原始数据中的总数量（异常检测前）
-        original_data = self.all_cycle_data[
-            (self.all_cycle_data['系列'] == series) &
-            (self.all_cycle_data['统一批次'] == batch)
-        ]
-        total_count = len(original_data)
+    def _calculate_basic_statistics(self, filtered_data):
+        """计算基本统计值 - 使用所有有效样品计算均值，所有批次一次分组聚合完成
 
-        # 当前group是异常检测后的数据，len(group)是异常检测后剩余的数据数量
-        filtered_count = len(group)
+        Args:
+            filtered_data: 异常检测后的数据
 
-        # 处理活性物质列 - 添加错误处理
-        active_material = '-'
-        if '活性物质' in group.columns:
+        Returns:
+            dict: (系列, 统一批次) -> 基本统计值字典
+        """
+        keys = ['系列', '统一批次']
+
+        # 该批次在原始数据中的总数量（异常检测前）
+        total_counts = self.all_cycle_data.groupby(keys, sort=False, observed=True).size().to_dict()
+
+        # 各指标均值及保留位数（活性物质整列一次转为数值，无法转换的值视为空值）
+        mean_digits = {'首充': 2, '首放': 2, '首效': 2, '首圈电压': 3, '首圈能量': 2}
+        agg_data = filtered_data[keys + [col for col in mean_digits if col in filtered_data.columns]]
+        if '活性物质' in filtered_data.columns:
             try:
-                # 尝试转换为数值并计算平均值
-                numeric_values = pd.to_numeric(group['活性物质'], errors='coerce')
-                if not numeric_values.dropna().empty:
-                    active_material = round(numeric_values.mean(), 2)
+                agg_data = agg_data.assign(活性物质=pd.to_numeric(filtered_data['活性物质'], errors='coerce'))
+                mean_digits['活性物质'] = 2
             except Exception as e:
-                print(f"计算活性物质平均值时出错: {str(e)}，批次: {batch}")
+                print(f"计算活性物质平均值时出错: {str(e)}")
+        mean_cols = [col for col in mean_digits if col in agg_data.columns]
 
-        return {
-            '系列': series,
-            '统一批次': batch,
-            '上架时间': group['上架时间'].iloc[0] if '上架时间' in group.columns else '-',
-            '总数据': total_count,
-            '首周有效数据': filtered_count,  # 异常检测后剩余的数据数量
-            '首充': round(group['首充'].mean(), 2) if '首充' in group.columns else None,
-            '首放': round(group['首放'].mean(), 2) if '首放' in group.columns else None,
-            '首效': round(group['首效'].mean(), 2) if '首效' in group.columns else None,
-            '首圈电压': round(group['首圈电压'].mean(), 3) if '首圈电压' in group.columns else None,
-            '首圈能量': round(group['首圈能量'].mean(), 2) if '首圈能量' in group.columns else None,
-            '活性物质': active_material
-        }
+        # 各指标均值和异常检测后剩余的数据数量在同一次分组中得到
+        grouped = agg_data.groupby(keys, sort=False, observed=True)
+        batch_stats = grouped[mean_cols].mean().round(mean_digits)
+        batch_stats['首周有效数据'] = grouped.size()
+
+        # 每个批次第一行的上架时间
+        if '上架时间' in filtered_data.columns:
+            first_times = filtered_data.drop_duplicates(keys).set_index(keys)['上架时间'].to_dict()
+        else:
+            first_times = {}
+
+        basic_stats = {}
+        for key, batch_means in batch_stats.to_dict('index').items():
+            series, batch = key
+            active_material = batch_means.get('活性物质', np.nan)
+            basic_stats[key] = {
+                '系列': series,
+                '统一批次': batch,
+                '上架时间': first_times.get(key, '-'),
+                '总数据': total_counts.get(key, 0),
+                '首周有效数据': batch_means['首周有效数据'],  # 异常检测后剩余的数据数量
+                '首充': batch_means.get('首充'),
+                '首放': batch_means.get('首放'),
+                '首效': batch_means.get('首效'),
+                '首圈电压': batch_means.get('首圈电压'),
+                '首圈能量': batch_means.get('首圈能量'),
+                '活性物质': '-' if pd.isna(active_material) else active_material
+            }
+        return basic_stats
 
     def _calculate_cycle_statistics(self, stats, group):
         """计算循环数据统计值
@@ -3261,82 +3770,69 @@ class BatteryDataProcessor:
             stats['1C首周有效数据'] = 0
             stats['1C参考通道'] = None
             stats['1C状态'] = None
-            stats['1C首圈编号'] = None
-            stats['1C首充'] = None
-            stats['1C首放'] = None
-            stats['1C首效'] = None
-            stats['1C倍率比'] = None
-            stats['参考通道当前圈数'] = None  # 确保初始化参考通道当前圈数字段
-            stats['当前容量保持'] = None
-            stats['电压衰减率mV/周'] = None
-            stats['当前电压保持'] = None
-            stats['当前能量保持'] = None
+            stats.update(dict.fromkeys(_REF_CHANNEL_FIELDS))
 
             if '模式' in group.columns:
                 # 提取所有1C模式的数据
-                all_1c_data = group[group['模式'].isin(CONFIG["MODE_CONFIG"]["one_c_modes"])]
+                all_1c_data = group[group['模式'].isin(_ONE_C_MODES)]
 
                 # 详细调试信息 - 统一批次和原始数据
                 print(f"\n============= 统一批次分析: {stats['统一批次']} =============")
                 print(f"该批次总样品数: {len(group)}, 其中1C模式样品数: {len(all_1c_data)}")
 
-                if not all_1c_data.empty:
-                    # 详细列出每个样品的首效和状态
+                if not all_1c_data.empty and self.verbose:
+                    # 详细列出每个样品的首效和状态（仅详细模式）
                     print("\n样品详情:")
-                    for idx, row in all_1c_data.iterrows():
-                        print(f"  样品 {row['主机']}-{row['通道']}: 首效={row['1C首效']}%, 状态={row['1C状态']}")
+                    for host, channel, efficiency, status in all_1c_data[
+                            ['主机', '通道', '1C首效', '1C状态']].itertuples(index=False, name=None):
+                        print(f"  样品 {host}-{channel}: 首效={efficiency}%, 状态={status}")
 
                 # 检查是否有缺失的通道
                 if self.verbose:
                     print("\n检查是否有缺失的通道:")
-                    # 获取该批次在原始数据中的所有通道
-                    batch_mask = (self.all_cycle_data['统一批次'] == stats['统一批次'])
-                    all_channels_in_batch = self.all_cycle_data[batch_mask][['主机', '通道']].drop_duplicates()
+                    # 获取该批次在原始数据中的所有通道（每个通道取第一行，用于输出缺失通道的数据）
+                    # （按统一批次的行位置缓存直接取行，不再整表比较统一批次列）
+                    batch_rows = self._get_batch_indices(self.all_cycle_data).get(stats['统一批次'], [])
+                    all_channels_in_batch = self.all_cycle_data[['主机', '通道', '首放', '首效', '批次']].iloc[batch_rows]
+                    all_channels_in_batch = all_channels_in_batch.drop_duplicates(['主机', '通道'])
                     print(f"原始数据中该批次的所有通道:")
-                    for i, (_, row) in enumerate(all_channels_in_batch.iterrows()):
-                        print(f"  {i+1}. 主机={row['主机']}, 通道={row['通道']}")
+                    for i, (host, channel) in enumerate(zip(all_channels_in_batch['主机'], all_channels_in_batch['通道'])):
+                        print(f"  {i+1}. 主机={host}, 通道={channel}")
 
                     # 获取当前分组中的所有通道
                     current_channels = group[['主机', '通道']].drop_duplicates()
                     print(f"当前分组中的所有通道:")
-                    for i, (_, row) in enumerate(current_channels.iterrows()):
-                        print(f"  {i+1}. 主机={row['主机']}, 通道={row['通道']}")
+                    for i, (host, channel) in enumerate(zip(current_channels['主机'], current_channels['通道'])):
+                        print(f"  {i+1}. 主机={host}, 通道={channel}")
 
-                    # 找出缺失的通道
-                    all_channels_set = set(tuple(row) for _, row in all_channels_in_batch.iterrows())
-                    current_channels_set = set(tuple(row) for _, row in current_channels.iterrows())
-                    missing_channels = all_channels_set - current_channels_set
+                    # 找出缺失的通道：左连接后只出现在原始数据中的通道
+                    merged = all_channels_in_batch.merge(current_channels, on=['主机', '通道'], how='left', indicator=True)
+                    missing_channels = merged[merged['_merge'] == 'left_only']
 
-                    if missing_channels:
+                    if not missing_channels.empty:
                         print(f"缺失的通道数: {len(missing_channels)}")
                         print("缺失的通道:")
-                        for host, channel in missing_channels:
-                            # 查找原始数据中的行
-                            row = self.all_cycle_data[(self.all_cycle_data['主机'] == host) & (self.all_cycle_data['通道'] == channel)].iloc[0]
-                            print(f"  主机={host}, 通道={channel}, 首放={row['首放']}, 首效={row['首效']}, 批次={row['批次']}")
+                        for host, channel, first_discharge, first_eff, batch in missing_channels[
+                                ['主机', '通道', '首放', '首效', '批次']].itertuples(index=False, name=None):
+                            print(f"  主机={host}, 通道={channel}, 首放={first_discharge}, 首效={first_eff}, 批次={batch}")
                     else:
                         print("没有缺失的通道")
 
-                # 1. 准确分离不同状态的样品子集
+                # 1. 准确分离不同状态的样品子集（按1C状态一次分组得到各状态的行位置）
+                status_rows = all_1c_data.groupby('1C状态', sort=False, observed=True).indices
+                no_rows = np.array([], dtype=np.intp)
+
                 # 正常样品：首效 ≥ 85%
-                normal_samples = all_1c_data[
-                    (all_1c_data['1C状态'] == '正常')
-                ]
+                normal_samples = all_1c_data.iloc[status_rows.get('正常', no_rows)]
 
                 # 首效低样品：80% ≤ 首效 < 85%
-                low_eff_samples = all_1c_data[
-                    (all_1c_data['1C状态'] == '首效低')
-                ]
+                low_eff_samples = all_1c_data.iloc[status_rows.get('首效低', no_rows)]
 
                 # 首效过低样品：首效 < 80%
-                very_low_eff_samples = all_1c_data[
-                    (all_1c_data['1C状态'] == '首效过低')
-                ]
+                very_low_eff_samples = all_1c_data.iloc[status_rows.get('首效过低', no_rows)]
 
                 # 过充样品
-                overcharge_samples = all_1c_data[
-                    (all_1c_data['1C状态'] == '1C过充')
-                ]
+                overcharge_samples = all_1c_data.iloc[status_rows.get('1C过充', no_rows)]
 
                 # 打印状态分布信息，帮助调试
                 print(f"\n状态分布:")
@@ -3375,22 +3871,19 @@ class BatteryDataProcessor:
                     # 选择参考通道
                     print(f"\n开始参考通道选择...")
 
-                    # 记录所有通道信息，便于出错时调试
-                    try:
-                        print("\n==== 详细通道信息 ====")
-                        for idx, channel_row in reference_data.iterrows():
-                            print(f"通道索引 {idx}:")
-                            print(f"  主机: {channel_row['主机']}")
-                            print(f"  通道: {channel_row['通道']}")
-                            print(f"  批次: {channel_row['批次']}")
-                            if '文件名' in channel_row:
-                                print(f"  文件名: {channel_row['文件名']}")
-                            elif '文件路径' in channel_row:
-                                print(f"  文件路径: {channel_row['文件路径']}")
-                    except Exception as debug_error:
-                        print(f"打印通道信息时出错: {str(debug_error)}")
-
-                    print("==== 通道信息结束 ====\n")
+                    # 记录所有通道信息到调试日志，便于出错时调试（DEBUG级别未启用时不遍历也不格式化）
+                    if self.logger.debug_enabled:
+                        try:
+                            file_col = next((col for col in ('文件名', '文件路径') if col in reference_data.columns), None)
+                            self.logger.log_debug("==== 批次 %s 详细通道信息 ====", stats['统一批次'])
+                            for idx, host, channel, batch, file_info in zip(
+                                    reference_data.index, reference_data['主机'], reference_data['通道'],
+                                    reference_data['批次'],
+                                    reference_data[file_col] if file_col else [None] * len(reference_data)):
+                                self.logger.log_debug("通道索引 %s: 主机=%s, 通道=%s, 批次=%s%s", idx, host, channel, batch,
+                                                      f", {file_col}={file_info}" if file_col else "")
+                        except Exception as debug_error:
+                            print(f"记录通道信息时出错: {str(debug_error)}")
 
                     try:
                         # 根据配置的方法优先级选择参考通道
@@ -3483,23 +3976,15 @@ class BatteryDataProcessor:
                             stats['1C参考通道'] = f"{ref_channel['主机']}-{ref_channel['通道']}"
                             print(f"\n【结果】: 成功选择参考通道: {stats['1C参考通道']}")
 
-                            # 使用参考通道的实际值
-                            print("\n参考通道数据:")
-                            # 1C相关数据 - 直接使用参考通道的实际值
-                            for key in ['1C首圈编号', '1C首充', '1C首放', '1C首效', '1C倍率比']:
-                                if key in ref_channel and pd.notna(ref_channel[key]):
-                                    stats[key] = ref_channel[key]
-                                    print(f"  {key}: {stats[key]}")
-
-                            # 容量保持率相关数据 - 直接使用参考通道的实际值
-                            for field in ['当前圈数', '当前容量保持', '电压衰减率mV/周', '当前电压保持', '当前能量保持']:
-                                if field in ref_channel and pd.notna(ref_channel[field]):
-                                    if field == '当前圈数':
-                                        stats['参考通道当前圈数'] = ref_channel[field]  # 特别处理参考通道当前圈数
-                                        print(f"  参考通道当前圈数: {stats['参考通道当前圈数']}")
-                                    else:
-                                        stats[field] = ref_channel[field]
-                                        print(f"  {field}: {stats[field]}")
+                            # 1C相关数据和容量保持率相关数据 - 直接使用参考通道的实际值
+                            ref_values = {key: ref_channel[col] for key, col in _REF_CHANNEL_FIELDS.items()
+                                          if col in ref_channel.index and pd.notna(ref_channel[col])}
+                            stats.update(ref_values)
+
+                            if self.verbose:
+                                print("\n参考通道数据:")
+                                for key, value in ref_values.items():
+                                    print(f"  {key}: {value}")
                         except Exception as data_error:
                             print(f"设置参考通道数据时出错: {str(data_error)}")
                     else:
@@ -3541,46 +4026,21 @@ class BatteryDataProcessor:
                     features = ['首放', '首效', '首圈电压']
                     available_features = [f for f in features if f in data_subset.columns]
 
-                    if len(available_features) >= 2:  # 至少要有2个特征才能用PCA
+                    if len(available_features) >= 2:  # 至少要有2个特征
                         return self._multi_feature_reference_selection(data_subset, features=available_features)
                 except Exception as e:
                     print(f"多特征参考通道选择失败: {str(e)}, 回退到传统方法")
 
             # 回退到传统方法: 基于首放选择
-            subset_discharge_mean = data_subset['首放'].mean()
+            discharge_values = data_subset['首放'].to_numpy(dtype=np.float64)
+            subset_discharge_mean = np.nanmean(discharge_values)
             print(f"使用传统方法, 首放平均值: {subset_discharge_mean:.2f}")
 
-            # 计算每个通道与子集平均值的差异
-            try:
-                indexed_subset = data_subset.set_index(['主机', '通道'], drop=False)
-                diff_series = abs(indexed_subset['首放'] - subset_discharge_mean)
-
-                # 找到差异最小的通道的复合索引
-                min_diff_idx_tuple = diff_series.idxmin()
-                print(f"找到差异最小的通道: 主机={min_diff_idx_tuple[0]}, 通道={min_diff_idx_tuple[1]}")
-
-                # 从原始data_subset中获取对应行
-                best_channel_row = data_subset[
-                    (data_subset['主机'] == min_diff_idx_tuple[0]) &
-                    (data_subset['通道'] == min_diff_idx_tuple[1])
-                ]
-
-                if not best_channel_row.empty:
-                    print(f"传统方法选择的参考通道: {min_diff_idx_tuple[0]}-{min_diff_idx_tuple[1]}")
-                    return best_channel_row.iloc[0]
-                else:
-                    print(f"警告: 无法在数据中找到通道: 主机={min_diff_idx_tuple[0]}, 通道={min_diff_idx_tuple[1]}")
-                    # 失败时使用首行
-                    print(f"使用第一行作为参考通道")
-                    return data_subset.iloc[0]
-            except Exception as index_error:
-                print(f"使用索引查找参考通道时出错: {str(index_error)}")
-                print(f"尝试直接使用首放最接近平均值的行")
-
-                # 计算直接使用首放列的差异
-                diff_values = abs(data_subset['首放'] - subset_discharge_mean)
-                closest_idx = diff_values.idxmin()
-                return data_subset.loc[closest_idx]
+            # 直接在数组上找与子集平均值差异最小的位置, 并列时取首个
+            best_pos = int(np.nanargmin(np.abs(discharge_values - subset_discharge_mean)))
+            best_channel_row = data_subset.iloc[best_pos]
+            print(f"传统方法选择的参考通道: {best_channel_row['主机']}-{best_channel_row['通道']}")
+            return best_channel_row
 
         except Exception as outer_error:
             print(f"选择参考通道过程中出现严重错误: {str(outer_error)}")
@@ -3600,6 +4060,7 @@ class BatteryDataProcessor:
             output_dir: 输出目录，如果不指定则使用当前目录
         """
         # 检查是否有数据可以导出
+        self._ensure_dataframes()
         has_data = (not self.all_cycle_data.empty or
                    not self.all_first_cycle.empty or
                    not self.all_error_data.empty or
@@ -3628,7 +4089,11 @@ class BatteryDataProcessor:
             print(f"\n正在创建汇总表: {output_path}")
 
             # 创建Excel写入器
-            writer = pd.ExcelWriter(output_path)
+            excel_engine = CONFIG["OUTPUT_CONFIG"]["excel_engine"]
+            engine_kwargs = None
+            if excel_engine == "xlsxwriter":
+                engine_kwargs = {"options": CONFIG["OUTPUT_CONFIG"].get("xlsxwriter_options", {})}
+            writer = pd.ExcelWriter(output_path, engine=excel_engine, engine_kwargs=engine_kwargs)
 
             # 写入各个工作表
             sheets_written = 0
@@ -3743,22 +4208,22 @@ class BatteryDataProcessor:
                 print("请检查是否安装了必要的库，如matplotlib和seaborn")
 
     def _sort_dataframes(self):
-        """排序所有数据框"""
+        """排序所有数据框（稳定排序，索引重置为从1开始的RangeIndex）"""
         if not self.all_cycle_data.empty:
-            self.all_cycle_data = self.all_cycle_data.sort_values(['系列', '批次'], ascending=True)
-            self.all_cycle_data.index = range(1, len(self.all_cycle_data) + 1)
+            self.all_cycle_data = self.all_cycle_data.sort_values(['系列', '批次'], ascending=True, kind='stable', ignore_index=True)
+            self.all_cycle_data.index = pd.RangeIndex(1, len(self.all_cycle_data) + 1)
 
         if not self.all_first_cycle.empty:
-            self.all_first_cycle = self.all_first_cycle.sort_values(['系列', '批次'], ascending=True)
-            self.all_first_cycle.index = range(1, len(self.all_first_cycle) + 1)
+            self.all_first_cycle = self.all_first_cycle.sort_values(['系列', '批次'], ascending=True, kind='stable', ignore_index=True)
+            self.all_first_cycle.index = pd.RangeIndex(1, len(self.all_first_cycle) + 1)
 
         if not self.all_error_data.empty:
-            self.all_error_data = self.all_error_data.sort_values(['系列', '批次'], ascending=True)
-            self.all_error_data.index = range(1, len(self.all_error_data) + 1)
+            self.all_error_data = self.all_error_data.sort_values(['系列', '批次'], ascending=True, kind='stable', ignore_index=True)
+            self.all_error_data.index = pd.RangeIndex(1, len(self.all_error_data) + 1)
 
         if not self.inconsistent_data.empty:
-            self.inconsistent_data = self.inconsistent_data.sort_values(['系列', '上架时间'], ascending=True)
-            self.inconsistent_data.index = range(1, len(self.inconsistent_data) + 1)
+            self.inconsistent_data = self.inconsistent_data.sort_values(['系列', '上架时间'], ascending=True, kind='stable', ignore_index=True)
+            self.inconsistent_data.index = pd.RangeIndex(1, len(self.inconsistent_data) + 1)
 
     def _write_to_excel(self, writer, df, sheet_name):
         """将DataFrame写入Excel
@@ -3799,12 +4264,23 @@ class BatteryDataProcessor:
         columns_to_clean_for_none = ['1C参考通道', '1C状态']
         for col in columns_to_clean_for_none:
             if col in df_to_write.columns:
-                df_to_write[col] = df_to_write[col].fillna('')
+                df_to_write[col] = df_to_write[col].astype(object).fillna('')
 
         # 写入Excel，无需设置列宽
         df_to_write.to_excel(writer, sheet_name=sheet_name, index=False)
 
     # ===== 可视化方法 =====
+    def _savefig(self, target, **kwargs):
+        """按绘图配置保存当前图表（统一DPI，使用快速PNG压缩）
+
+        Args:
+            target: 保存路径或文件对象
+            **kwargs: 传给plt.savefig的其他参数
+        """
+        plot_config = CONFIG["PLOT_CONFIG"]
+        plt.savefig(target, dpi=plot_config.get("dpi", 150), bbox_inches='tight',
+                    pil_kwargs={'compress_level': plot_config.get("png_compress_level", 3)}, **kwargs)
+
     def plot_boxplot(self, x, y, df, y_min, y_max, title=None):
         """绘制箱线图
 
@@ -3842,13 +4318,14 @@ class BatteryDataProcessor:
         Returns:
             matplotlib图形对象
         """
+        self._ensure_dataframes()
         if self.all_cycle_data.empty or '1C首圈编号' not in self.all_cycle_data.columns:
             print("没有1C首圈数据可供分析")
             return None
 
         # 只分析有效的1C数据
         valid_data = self.all_cycle_data[
-            self.all_cycle_data['模式'].isin(CONFIG["MODE_CONFIG"]["one_c_modes"]) &
+            self.all_cycle_data['模式'].isin(_ONE_C_MODES) &
             self.all_cycle_data['1C首圈编号'].notna()
         ]
 
@@ -3885,10 +4362,35 @@ class BatteryDataProcessor:
         plt.tight_layout()
 
         if save_path:
-            plt.savefig(save_path, dpi=300, bbox_inches='tight')
+            self._savefig(save_path)
 
         return plt.gcf()
 
+    def _return_first_match(self, channel_key, data):
+        """按通道标识在数据中查找对应的行（保留率比较只剩一个有效通道时直接返回该通道）
+
+        Args:
+            channel_key: 通道标识（主机-通道）
+            data: 候选参考通道数据
+
+        Returns:
+            匹配的行或None
+        """
+        # 使用统一的通道解析方法
+        host, channel = self._extract_host_and_channel(channel_key)
+        if host and channel:
+            match = self._try_match_channel(host, channel, data)
+            if match is not None:
+                print(f"通道匹配成功! 主机={host}, 通道={channel}")
+                return match
+
+        # 如果所有尝试都失败，回退到按第一个"-"拆分主机和通道
+        channel_parts = channel_key.split('-')
+        match_data = data[(data['主机'] == channel_parts[0]) & (data['通道'] == '-'.join(channel_parts[1:]))]
+        if not match_data.empty:
+            return match_data.iloc[0]
+        return None
+
     def _try_match_channel(self, host, channel, data):
         """尝试多种方式匹配通道
 
@@ -3933,6 +4435,178 @@ class BatteryDataProcessor:
 
         return None
 
+# ===== 多进程文件处理 =====
+_worker_processor = None
+
+# 当前进程已渲染的Z-score分布图数量，用于定期回收内存
+_rendered_plot_count = 0
+
+
+def _init_file_worker(config):
+    """工作进程初始化：同步主进程配置，并创建不带日志系统的轻量处理器
+
+    Args:
+        config: 主进程的CONFIG字典
+    """
+    global _worker_processor
+    CONFIG.update(config)
+    _worker_processor = BatteryDataProcessor.__new__(BatteryDataProcessor)
+    _worker_processor.folder_path = None
+    _worker_processor.verbose = CONFIG["RUNTIME_CONFIG"]["verbose"]
+    # 绘图任务需要与主进程相同的后端和中文字体设置
+    _worker_processor._setup_plot_environment()
+
+
+def _process_file_task(file_path, series_name, processor=None):
+    """处理单个文件（模块级函数，可被多进程序列化调用）
+
+    Args:
+        file_path: 文件路径
+        series_name: 系列名称
+        processor: 使用的处理器实例，None时使用工作进程中的处理器
+
+    Returns:
+        ((状态, 数据), 输出消息列表)：状态和数据含义见BatteryDataProcessor._process_single_file；
+        处理过程中的输出先收集起来随结果返回，由主进程统一输出（工作进程的输出不会写入主进程的日志文件）
+    """
+    processor = processor or _worker_processor
+    file_name = os.path.basename(file_path)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        try:
+            result = processor._process_single_file(file_path, series_name, file_name)
+        except Exception as e:
+            if processor.verbose:
+                print(f"处理文件失败: {file_name}, 错误: {str(e)}")
+            result = ('skip', file_path)
+    return result, output.getvalue().splitlines()
+
+
+def _render_zscore_batch(task, zscore_dir, timestamp, processor=None):
+    """渲染并保存单个批次的Z-score分布图（模块级函数，可被多进程序列化调用）
+
+    Args:
+        task: (批次名称, 子图数据列表) 元组，子图数据为
+              (指标, 阈值, 中位数, MAD, 修正Z-score数组, 对应通道标签数组)
+        zscore_dir: 图片保存目录
+        timestamp: 文件名中的时间戳
+        processor: 未使用，与其他任务函数保持一致的调用形式
+
+    Returns:
+        list: 需要在主进程输出的提示信息
+    """
+    global _rendered_plot_count
+    batch_name, panels = task
+    plot_config = CONFIG["OUTLIER_DETECTION"]['zscore_mad']
+    messages = []
+
+    # 直接创建Figure（不经过pyplot状态机，避免大量批次时图表对象累积占用内存）
+    fig = Figure(figsize=(15, 12), layout="constrained")
+    FigureCanvasAgg(fig)
+    fig.suptitle(f'批次 {batch_name} 的修正Z-score分布图', fontsize=16, fontweight='bold')
+
+    axes = fig.subplots(2, 2).flatten()
+    plot_idx = 0
+
+    for metric, threshold, median, mad, modified_z_scores, channel_labels in panels:
+        # 绘制分布图
+        ax = axes[plot_idx]
+
+        # 绘制直方图
+        ax.hist(modified_z_scores, bins=20, alpha=0.7,
+               color='skyblue', edgecolor='black', density=True)
+
+        # 标记阈值线
+        ax.axvline(threshold, color='red', linestyle='--', linewidth=2,
+                  label=f'正阈值: {threshold}')
+        ax.axvline(-threshold, color='red', linestyle='--', linewidth=2,
+                  label=f'负阈值: -{threshold}')
+
+        # 标记异常点
+        outliers = np.abs(modified_z_scores) > threshold
+        outlier_count = outliers.sum()
+
+        if outlier_count > 0:
+            outlier_scores = modified_z_scores[outliers]
+            outlier_labels = channel_labels[outliers]
+
+            # 绘制异常点
+            ax.scatter(outlier_scores, [0.02] * len(outlier_scores),
+                     color='red', s=50, marker='x',
+                     label=f'异常点: {outlier_count}个')
+
+            # 为异常点添加通道标签（只在异常点不太多时显示）
+            if outlier_count <= 5:  # 避免标签过多导致图表混乱
+                for score, channel_label in zip(outlier_scores, outlier_labels):
+                    ax.annotate(channel_label,
+                              (score, 0.02),
+                              xytext=(5, 10),
+                              textcoords='offset points',
+                              fontsize=8,
+                              color='red',
+                              ha='left')
+
+        # 设置标题和标签
+        ax.set_title(f'{metric}\n(中位数: {median:.2f}, MAD: {mad:.2f})',
+                   fontsize=12, fontweight='bold')
+        ax.set_xlabel('修正Z-score', fontsize=10)
+        ax.set_ylabel('密度', fontsize=10)
+        ax.legend(fontsize=9)
+        ax.grid(True, alpha=0.3)
+
+        # 添加统计信息
+        sample_count = len(modified_z_scores)
+        stats_text = f'样本数: {sample_count}\n异常数: {outlier_count}\n异常率: {outlier_count/sample_count*100:.1f}%'
+
+        # 如果有异常点且数量不太多，添加异常通道列表
+        if outlier_count > 0 and outlier_count <= 3:
+            stats_text += f'\n异常通道:\n' + '\n'.join(outlier_labels)
+        elif outlier_count > 3:
+            stats_text += f'\n异常通道过多\n详见日志文件'
+
+        ax.text(0.02, 0.98, stats_text, transform=ax.transAxes,
+               verticalalignment='top', fontsize=8,
+               bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
+
+        plot_idx += 1
+
+    # 隐藏未使用的子图
+    for i in range(plot_idx, 4):
+        axes[i].set_visible(False)
+
+    # 保存图片（批次名去除非法字符并截断，附加批次名哈希保证文件名长度有限且不重名）
+    safe_batch_name = _UNSAFE_FILENAME_RE.sub('', str(batch_name))[:40].rstrip()
+    name_hash = hashlib.sha1(str(batch_name).encode('utf-8')).hexdigest()[:6]
+    filename = f"Z-score分布图_{safe_batch_name or 'batch'}_{name_hash}_{timestamp}.png"
+    filepath = os.path.join(zscore_dir, filename)
+
+    try:
+        # 使用较低的DPI和快速PNG压缩保存
+        fig.savefig(filepath, dpi=plot_config.get('plot_dpi', 150), bbox_inches='tight', format='png',
+                    pil_kwargs={'compress_level': plot_config.get('png_compress_level', 6)})
+        messages.append(f"已保存Z-score分布图: {filename}")
+    except Exception as e:
+        messages.append(f"保存Z-score分布图失败: {e}")
+        # 尝试备用保存方法
+        try:
+            backup_filename = f"Z-score分布图_backup_{timestamp}.png"
+            backup_filepath = os.path.join(zscore_dir, backup_filename)
+            fig.savefig(backup_filepath, dpi=100, format='png')
+            messages.append(f"使用备用方法保存: {backup_filename}")
+        except Exception as e2:
+            messages.append(f"备用保存方法也失败: {e2}")
+
+    fig.clear()
+    del fig
+
+    # 每渲染20个批次强制回收一次，保持内存占用平稳
+    _rendered_plot_count += 1
+    if _rendered_plot_count % 20 == 0:
+        gc.collect()
+
+    return messages
+
+
 def identify_series_from_filename(file_name):
     """从文件名中提取系列标识
 
@@ -4088,11 +4762,11 @@ def main(folder_path):
 
     # 记录主函数开始到调试日志
     processor.logger.log_debug("主函数开始执行")
-    processor.logger.log_debug(f"开始时间: {start_time_str}")
+    processor.logger.log_debug("开始时间: %s", start_time_str)
 
     # 自动检测系列组，如果有多个系列，则提取数字作为批次号
     file_groups = auto_detect_series(folder_path)
-    processor.logger.log_debug(f"检测到文件组: {list(file_groups.keys())}")
+    processor.logger.log_debug("检测到文件组: %s", list(file_groups.keys()))
 
     # 处理所有文件
     processor.process_all_files(file_groups)
@@ -4199,6 +4873,9 @@ def plot_comparison(dataframes, columns, title="数据比较", figsize=(12, 8)):
 
 # ===== 程序执行入口 =====
 if __name__ == "__main__":
+    # 打包为exe后多进程需要此调用
+    multiprocessing.freeze_support()
+
     print("=" * 80)
     print("LIMS数据处理程序 - 电池数据分析工具")
     print("=" * 80)